@@ -8,7 +8,8 @@ from django.urls import path
 from elearning.views import \
   UserViewSet, StudentViewSet, \
   TeacherViewSet, CourseViewSet, LessonViewSet, \
-  QuestionViewSet, AnswerViewSet
+  QuestionViewSet, AnswerViewSet, TaskViewSet, \
+  SearchViewSet, MeViewSet
 
 # Routers provide an easy way of automatically determining the URL conf.
 router = routers.DefaultRouter()
@@ -19,6 +20,9 @@ router.register(r'courses', CourseViewSet, base_name='courses')
 router.register(r'lessons', LessonViewSet, base_name='lessons')
 router.register(r'questions', QuestionViewSet, base_name='questions')
 router.register(r'answers', AnswerViewSet, base_name='answers')
+router.register(r'tasks', TaskViewSet, base_name='tasks')
+router.register(r'search', SearchViewSet, base_name='search')
+router.register(r'me', MeViewSet, base_name='me')
 
 course_router = routers.NestedSimpleRouter(router, r'courses', lookup='course')
 course_router.register(r'lessons', LessonViewSet, base_name='lessons')
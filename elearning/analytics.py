@@ -0,0 +1,154 @@
+import numpy as np
+
+from django.core.cache import caches
+from django.db import connections
+
+from elearning.conf import get_setting
+from elearning.grading import QUESTION_RULES, get_answer_key
+from elearning.models import LessonStudent
+
+def load_submissions(lesson):
+  """
+  Scores and selected answers of every submission of `lesson` as arrays:
+  scores (NaN when missing), flat answer ids and the submission index of
+  each answer id. Rows are read with a bare cursor, the packed answers
+  are decoded at once instead of one row at a time.
+  """
+  queryset = LessonStudent.objects.filter(lesson=lesson).values_list('score', 'answers')
+  sql, params = queryset.query.sql_with_params()
+
+  with connections[queryset.db].cursor() as cursor:
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+
+  scores = np.array([np.nan if score is None else score for score, answers in rows], dtype=float)
+  packed = [bytes(answers or b'') for score, answers in rows]
+  lengths = np.array([len(answers) // 4 for answers in packed], dtype=np.int64)
+
+  answer_ids = np.frombuffer(b''.join(packed), dtype='<u4').astype(np.int64)
+  submission = np.repeat(np.arange(len(rows)), lengths)
+
+  return scores, answer_ids, submission
+
+def correlation(x, y):
+  # pearson correlation of each column of x with the same column of y,
+  # None for columns without variance
+  x = x - x.mean(axis=0)
+  y = y - y.mean(axis=0)
+  denominator = np.sqrt((x ** 2).sum(axis=0) * (y ** 2).sum(axis=0))
+  with np.errstate(invalid='ignore', divide='ignore'):
+    result = (x * y).sum(axis=0) / denominator
+  return [None if np.isnan(value) else round(float(value), 4) for value in result]
+
+def lesson_stats(lesson):
+  """
+  Score distribution and item statistics of the submissions of `lesson`:
+  the difficulty of a question is the share of students passing it, its
+  discrimination the correlation between passing it and the score of the
+  rest of the lesson.
+  """
+  answer_key = get_answer_key(lesson)
+  scores, answer_ids, submission = load_submissions(lesson)
+
+  attempts = len(scores)
+  graded = scores[~np.isnan(scores)]
+
+  stats = {
+    'attempts': attempts,
+    'mean': None,
+    'median': None,
+    'std': None,
+    'min': None,
+    'max': None,
+    'pass_rate': None,
+    'histogram': [],
+    'questions': [],
+  }
+
+  if len(graded):
+    approval_score = lesson.approval_score
+    passed = graded >= approval_score if approval_score is not None else np.ones(len(graded), dtype=bool)
+    counts = np.bincount(np.clip(graded, 0, None).astype(np.int64))
+    stats.update({
+      'mean': round(float(graded.mean()), 4),
+      'median': float(np.median(graded)),
+      'std': round(float(graded.std()), 4),
+      'min': float(graded.min()),
+      'max': float(graded.max()),
+      'pass_rate': round(float(passed.mean()), 4),
+      'histogram': [{'score': score, 'count': int(count)} for score, count in enumerate(counts) if count],
+    })
+
+  # answers and questions of the key as columns
+  key_answer_ids = np.array(sorted(answer_key.answers), dtype=np.int64)
+  question_ids = sorted(answer_key.questions)
+  question_index = {question_id: i for i, question_id in enumerate(question_ids)}
+  answer_question = np.array([question_index[answer_key.answers[pk][0]] for pk in key_answer_ids], dtype=np.int64)
+  answer_correct = np.array([answer_key.answers[pk][1] for pk in key_answer_ids], dtype=np.int64)
+
+  # drop selected answers no longer in the key
+  position = np.searchsorted(key_answer_ids, answer_ids)
+  known = position < len(key_answer_ids)
+  known[known] = key_answer_ids[position[known]] == answer_ids[known]
+  position, submission = position[known], submission[known]
+
+  selections = np.bincount(position, minlength=len(key_answer_ids))
+
+  # selected and correct selected answers, by submission and question
+  shape = (attempts, len(question_ids))
+  answered = np.zeros(shape, dtype=np.int64)
+  correct = np.zeros(shape, dtype=np.int64)
+  np.add.at(answered, (submission, answer_question[position]), 1)
+  np.add.at(correct, (submission, answer_question[position]), answer_correct[position])
+
+  question_passed = np.zeros(shape, dtype=bool)
+  question_scores = np.zeros(len(question_ids))
+  for i, question_id in enumerate(question_ids):
+    question_type, score, total_correct = answer_key.questions[question_id]
+    question_passed[:, i] = (answered[:, i] > 0) & QUESTION_RULES[question_type](correct[:, i], total_correct)
+    question_scores[i] = score
+
+  if attempts:
+    # score of the rest of the lesson, without the question
+    rest = np.nan_to_num(scores)[:, None] - question_passed * question_scores
+    discrimination = correlation(question_passed.astype(float), rest)
+  else:
+    discrimination = [None] * len(question_ids)
+
+  for i, question_id in enumerate(question_ids):
+    answers = np.flatnonzero(answer_question == i)
+    stats['questions'].append({
+      'id': question_id,
+      'answered': round(float((answered[:, i] > 0).mean()), 4) if attempts else None,
+      'difficulty': round(float(question_passed[:, i].mean()), 4) if attempts else None,
+      'discrimination': discrimination[i],
+      'answers': [
+        {'id': int(key_answer_ids[j]), 'selected': int(selections[j])}
+        for j in answers
+      ],
+    })
+
+  return stats
+
+def stats_cache_key(lesson_id):
+  return 'elearning:lesson-stats:%s' % lesson_id
+
+def get_lesson_stats(lesson):
+  """
+  `lesson_stats` cached with the version of `lesson`, for
+  `LESSON_STATS_TIMEOUT` seconds or until submissions of the lesson are
+  saved or graded again, see `invalidate_lesson_stats`.
+  """
+  cache = caches[get_setting('LESSON_STATS_CACHE')]
+  cache_key = stats_cache_key(lesson.pk)
+
+  cached = cache.get(cache_key)
+  if cached is not None and cached[0] == lesson.version:
+    return cached[1]
+
+  stats = lesson_stats(lesson)
+  cache.set(cache_key, (lesson.version, stats), get_setting('LESSON_STATS_TIMEOUT'))
+  return stats
+
+def invalidate_lesson_stats(lesson_ids):
+  caches[get_setting('LESSON_STATS_CACHE')].delete_many([stats_cache_key(pk) for pk in set(lesson_ids)])
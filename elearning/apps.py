@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ElearningConfig(AppConfig):
     name = 'elearning'
+
+    def ready(self):
+        from elearning import checks, signals, tasks  # noqa
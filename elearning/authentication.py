@@ -0,0 +1,210 @@
+import copy
+import threading
+import time
+import uuid
+
+from django.core import signing
+from django.core.cache import caches
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication, get_authorization_header
+
+from elearning.cache import LRUCache
+from elearning.conf import get_setting
+from elearning.models import User
+
+class TokenCache(object):
+  """
+  Users of recently authenticated tokens, by token key. Entries expire
+  after `TOKEN_CACHE_TIMEOUT` seconds, which bounds how long a change made
+  by another process can go unnoticed; changes made by this process evict
+  them at once through `elearning.signals`.
+  """
+
+  def __init__(self, maxsize, timeout):
+    self._cache = LRUCache(maxsize, timeout, on_discard=self._discarded)
+    # user id -> token keys, to evict every token of a user, following
+    # the entries of the cache
+    self._keys = {}
+    self._lock = threading.Lock()
+
+  def _discarded(self, key, value):
+    self._forget(key, value[0].pk)
+
+  def _forget(self, key, user_id):
+    with self._lock:
+      keys = self._keys.get(user_id)
+      if keys is not None:
+        keys.discard(key)
+        if not keys:
+          del self._keys[user_id]
+
+  def get(self, key):
+    return self._cache.get(key)
+
+  def set(self, key, user, token):
+    self._cache.set(key, (user, token))
+    with self._lock:
+      self._keys.setdefault(user.pk, set()).add(key)
+
+  def delete(self, key):
+    cached = self._cache.get(key)
+    self._cache.delete(key)
+    if cached is not None:
+      self._forget(key, cached[0].pk)
+
+  def delete_user(self, user_id):
+    with self._lock:
+      keys = self._keys.pop(user_id, ())
+    for key in keys:
+      self._cache.delete(key)
+
+  def clear(self):
+    self._cache.clear()
+    with self._lock:
+      self._keys.clear()
+
+tokens = TokenCache(get_setting('TOKEN_CACHE_SIZE'), get_setting('TOKEN_CACHE_TIMEOUT'))
+
+class CachedTokenAuthentication(TokenAuthentication):
+  """
+  Token authentication looking up the token cache of the process before
+  the database, so most requests do not query tokens and users at all.
+  """
+
+  def authenticate_credentials(self, key):
+    cached = tokens.get(key)
+    if cached is None:
+      user, token = super().authenticate_credentials(key)
+      tokens.set(key, user, token)
+    else:
+      user, token = cached
+
+    # requests may change their user, the cached one is left untouched
+    return (copy.copy(user), token)
+
+ACCESS_TOKEN_SALT = 'elearning.access-token'
+
+class AccessToken(object):
+  """
+  Short lived token signed with the `SECRET_KEY`, carrying what
+  permissions need to know about its user, so it is verified without
+  any database access. `user` only has these claims, views needing the
+  rest of the user load it.
+  """
+
+  def __init__(self, claims, key=None):
+    self.claims = claims
+    self.key = key
+
+  @classmethod
+  def for_user(cls, user):
+    lifetime = get_setting('ACCESS_TOKEN_LIFETIME')
+    claims = {
+      'uid': user.pk,
+      'typ': user.user_type,
+      'stf': user.is_staff,
+      'jti': uuid.uuid4().hex,
+      'exp': int(time.time()) + lifetime,
+    }
+    return cls(claims, signing.dumps(claims, salt=ACCESS_TOKEN_SALT))
+
+  @classmethod
+  def verify(cls, key):
+    try:
+      claims = signing.loads(key, salt=ACCESS_TOKEN_SALT)
+    except signing.BadSignature:
+      raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+    if claims['exp'] <= time.time():
+      raise exceptions.AuthenticationFailed(_('Token expired.'))
+    if revoked_tokens.is_revoked(claims['jti']):
+      raise exceptions.AuthenticationFailed(_('Token revoked.'))
+
+    return cls(claims, key)
+
+  @property
+  def expires_in(self):
+    return max(0, self.claims['exp'] - int(time.time()))
+
+  @property
+  def user(self):
+    return User(
+      pk=self.claims['uid'],
+      user_type=self.claims['typ'],
+      is_staff=self.claims['stf'],
+      is_active=True
+    )
+
+  def revoke(self):
+    revoked_tokens.add(self.claims['jti'], self.claims['exp'])
+
+class RevokedTokens(object):
+  """
+  Identifiers of revoked access tokens until they expire anyway, which
+  keeps the list as short as the tokens revoked in the last lifetime.
+  Revocations are shared with the other processes through the django
+  cache `ACCESS_TOKEN_REVOCATION_CACHE`, it must be shared by all of
+  them (see `elearning.checks`).
+  """
+
+  def __init__(self):
+    # token id -> expiration time
+    self._expires = {}
+    self._lock = threading.Lock()
+
+  def shared_cache(self):
+    alias = get_setting('ACCESS_TOKEN_REVOCATION_CACHE')
+    return caches[alias] if alias else None
+
+  def add(self, jti, expires):
+    now = time.time()
+    with self._lock:
+      self._expires = {key: value for key, value in self._expires.items() if value > now}
+      self._expires[jti] = expires
+
+    shared_cache = self.shared_cache()
+    if shared_cache is not None:
+      shared_cache.set('elearning:revoked-token:%s' % jti, True, max(1, int(expires - now)))
+
+  def is_revoked(self, jti):
+    if jti in self._expires:
+      return True
+
+    shared_cache = self.shared_cache()
+    return bool(shared_cache and shared_cache.get('elearning:revoked-token:%s' % jti))
+
+  def clear(self):
+    with self._lock:
+      self._expires.clear()
+
+revoked_tokens = RevokedTokens()
+
+class SignedTokenAuthentication(BaseAuthentication):
+  """
+  Authenticate `Authorization: Bearer <access token>` headers,
+  see `AccessToken`.
+  """
+
+  keyword = 'Bearer'
+
+  def authenticate(self, request):
+    auth = get_authorization_header(request).split()
+
+    if not auth or auth[0].lower() != self.keyword.lower().encode():
+      return None
+
+    if len(auth) != 2:
+      raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+
+    try:
+      key = auth[1].decode()
+    except UnicodeError:
+      raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+
+    token = AccessToken.verify(key)
+    return (token.user, token)
+
+  def authenticate_header(self, request):
+    return self.keyword
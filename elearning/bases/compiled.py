@@ -0,0 +1,137 @@
+from collections import defaultdict
+
+from django.core.exceptions import FieldDoesNotExist
+
+from rest_framework import serializers
+from rest_framework.relations import PKOnlyObject, RelatedField
+
+from elearning.bases.fieldsets import prune
+from elearning.cache import LRUCache
+from elearning.conf import get_setting
+
+class NotCompilable(Exception):
+  pass
+
+class CompiledSerializer(object):
+  """
+  Read-only version of a model serializer working on `values_list` rows
+  instead of model instances. Fields are resolved once, when compiling,
+  so rendering a row only calls the `to_representation` of its values.
+  Nested serializers cost one query per relation, whatever the number
+  of rows. The output is the same as the `data` of the serializer.
+  """
+
+  def __init__(self, serializer):
+    if type(serializer).to_representation is not serializers.Serializer.to_representation:
+      raise NotCompilable('%s overrides to_representation' % type(serializer).__name__)
+
+    self.model = serializer.Meta.model
+    # primary key first, to join the rows of nested serializers
+    self.columns = ['pk']
+    self.fields = []
+
+    for field in serializer._readable_fields:
+      self.compile_field(field)
+
+  def column(self, name):
+    if name not in self.columns:
+      self.columns.append(name)
+    return self.columns.index(name)
+
+  def compile_field(self, field):
+    if field.source == '*' or '.' in field.source:
+      raise NotCompilable('source "%s" of %s' % (field.source, field.field_name))
+
+    try:
+      model_field = self.model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+      raise NotCompilable('%s is not a model field' % field.field_name)
+
+    if not model_field.is_relation:
+      self.fields.append(('value', field.field_name, self.column(model_field.attname), field.to_representation))
+
+    elif isinstance(field, serializers.ListSerializer) and model_field.one_to_many:
+      child = CompiledSerializer(field.child)
+      self.fields.append(('many', field.field_name, child, model_field.field.attname))
+
+    elif isinstance(field, serializers.BaseSerializer) and model_field.many_to_one:
+      child = CompiledSerializer(field)
+      self.fields.append(('one', field.field_name, self.column(model_field.attname), child))
+
+    elif isinstance(field, RelatedField) and model_field.many_to_one and field.use_pk_only_optimization():
+      to_representation = lambda value, field=field: field.to_representation(PKOnlyObject(pk=value))
+      self.fields.append(('value', field.field_name, self.column(model_field.attname), to_representation))
+
+    else:
+      raise NotCompilable('relation %s' % field.field_name)
+
+  def rows(self, queryset, extra=()):
+    # prefetching is useless on rows, nested data is loaded by `render`
+    return queryset.prefetch_related(None).values_list(*(self.columns + list(extra)))
+
+  def render(self, rows):
+    rows = list(rows)
+    nested = {}
+
+    for kind, name, *args in self.fields:
+      if kind == 'many':
+        child, fk = args
+        child_rows = list(child.rows(
+          child.model._default_manager.filter(**{fk + '__in': [row[0] for row in rows]}),
+          extra=[fk]
+        ))
+        grouped = defaultdict(list)
+        for child_row, data in zip(child_rows, child.render(child_rows)):
+          grouped[child_row[-1]].append(data)
+        nested[name] = grouped
+
+      elif kind == 'one':
+        index, child = args
+        pks = {row[index] for row in rows if row[index] is not None}
+        child_rows = list(child.rows(child.model._default_manager.filter(pk__in=pks)))
+        nested[name] = {child_row[0]: data for child_row, data in zip(child_rows, child.render(child_rows))}
+
+    result = []
+    for row in rows:
+      data = {}
+      for kind, name, *args in self.fields:
+        if kind == 'value':
+          index, to_representation = args
+          value = row[index]
+          data[name] = None if value is None else to_representation(value)
+        elif kind == 'many':
+          data[name] = nested[name].get(row[0], [])
+        else:
+          value = row[args[0]]
+          data[name] = None if value is None else nested[name].get(value)
+      result.append(data)
+
+    return result
+
+  def serialize(self, queryset):
+    return self.render(self.rows(queryset))
+
+# compiled serializers by class, None when they can not be compiled, and
+# by class and fieldset for sparse fieldsets
+_compiled = {}
+_fieldset_compiled = LRUCache(get_setting('FIELDSET_CACHE_SIZE'))
+NOT_CACHED = object()
+
+def compile_serializer(serializer):
+  try:
+    return CompiledSerializer(serializer)
+  except NotCompilable:
+    return None
+
+def get_compiled_serializer(serializer_class, fieldset=None):
+  if fieldset is not None:
+    key = (serializer_class, fieldset)
+    compiled = _fieldset_compiled.get(key, NOT_CACHED)
+    if compiled is NOT_CACHED:
+      compiled = compile_serializer(prune(serializer_class(), fieldset))
+      _fieldset_compiled.set(key, compiled)
+    return compiled
+
+  if serializer_class not in _compiled:
+    _compiled[serializer_class] = compile_serializer(serializer_class())
+  return _compiled[serializer_class]
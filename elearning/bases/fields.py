@@ -0,0 +1,46 @@
+import struct
+
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+class IdSetField(models.BinaryField):
+  """
+  Set of ids stored in a single column, packed as sorted little-endian
+  unsigned 32 bit integers. Its python value is a tuple of ints.
+  """
+
+  description = _("Packed set of ids")
+
+  def __init__(self, *args, **kwargs):
+    kwargs.setdefault('default', tuple)
+    super().__init__(*args, **kwargs)
+
+  @staticmethod
+  def pack(ids):
+    ids = sorted(set(ids))
+    return struct.pack('<%dI' % len(ids), *ids)
+
+  @staticmethod
+  def unpack(data):
+    data = bytes(data)
+    return struct.unpack('<%dI' % (len(data) // 4), data)
+
+  def from_db_value(self, value, expression, connection):
+    if value is None:
+      return value
+    return self.unpack(value)
+
+  def to_python(self, value):
+    if value is None or isinstance(value, tuple):
+      return value
+    if isinstance(value, (bytes, bytearray, memoryview)):
+      return self.unpack(value)
+    return tuple(sorted(set(int(pk) for pk in value)))
+
+  def get_db_prep_value(self, value, connection, prepared=False):
+    if value is not None and not isinstance(value, (bytes, bytearray, memoryview)):
+      value = self.pack(value)
+    return super().get_db_prep_value(value, connection, prepared)
+
+  def value_to_string(self, obj):
+    return ','.join(str(pk) for pk in self.value_from_object(obj) or ())
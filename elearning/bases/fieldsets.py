@@ -0,0 +1,99 @@
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+
+# A fieldset is the part of a serializer a request asks for with
+# `?fields=` and `?expand=`, both lists of dotted field names:
+#
+#   ?fields=id,title,questions.text  only these fields, at every level
+#   ?expand=questions                 only these nested serializers
+#
+# Without `?fields=`, or without fields of a level, every field of the
+# level is kept, and without `?expand=` every nested serializer. Fieldsets
+# are hashable, (fields, expand), to key the prefetch plans and compiled
+# serializers built for them.
+
+def parse_names(value):
+  return [name for name in (name.strip() for name in value.split(',')) if name]
+
+def fields_tree(names):
+  # {name: subtree or None for every field}, as sorted tuples
+  tree = {}
+  for name in names:
+    node = tree
+    for part in name.split('.'):
+      node = node.setdefault(part, {})
+
+  def freeze(node):
+    return tuple(sorted((name, freeze(child) if child else None) for name, child in node.items()))
+
+  return freeze(tree)
+
+def parse_fieldset(fields=None, expand=None):
+  """
+  Fieldset of the `fields` and `expand` query parameters, None when the
+  request asks for the whole serializer.
+  """
+  fields = parse_names(fields or '') or None
+  if fields is None and expand is None:
+    return None
+
+  if expand is not None:
+    # expanding a nested serializer expands the ones holding it
+    paths = set()
+    for name in parse_names(expand):
+      parts = name.split('.')
+      paths.update('.'.join(parts[:i]) for i in range(1, len(parts) + 1))
+    expand = tuple(sorted(paths))
+
+  return (fields_tree(fields) if fields is not None else None, expand)
+
+def nested_serializer(field):
+  if isinstance(field, serializers.ListSerializer):
+    return field.child
+  if isinstance(field, serializers.BaseSerializer):
+    return field
+  return None
+
+def is_nested_path(serializer, path):
+  for name in path.split('.'):
+    field = serializer.fields.get(name)
+    serializer = nested_serializer(field) if field is not None else None
+    if serializer is None:
+      return False
+  return True
+
+def prune_fields(serializer, fields, expand, prefix=''):
+  selected = dict(fields) if fields is not None else None
+
+  unknown = set(selected or ()) - set(serializer.fields)
+  if unknown:
+    raise ParseError('Unknown fields: %s.' % ', '.join(prefix + name for name in sorted(unknown)))
+
+  for name, field in list(serializer.fields.items()):
+    nested = nested_serializer(field)
+    path = prefix + name
+    subfields = selected.get(name) if selected is not None else None
+
+    if selected is not None and name not in selected:
+      serializer.fields.pop(name)
+    elif nested is None:
+      if subfields is not None:
+        raise ParseError('Unknown fields: %s.' % ', '.join('%s.%s' % (path, sub) for sub, tree in subfields))
+    elif expand is not None and path not in expand:
+      serializer.fields.pop(name)
+    else:
+      prune_fields(nested, subfields, expand, path + '.')
+
+def prune(serializer, fieldset):
+  """
+  Remove from `serializer`, and its nested serializers, the fields out
+  of `fieldset`. Unknown names are a parse error.
+  """
+  fields, expand = fieldset
+
+  for path in expand or ():
+    if not is_nested_path(serializer, path):
+      raise ParseError('Unknown nested field: %s.' % path)
+
+  prune_fields(serializer, fields, expand)
+  return serializer
@@ -0,0 +1,18 @@
+import msgpack
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+class MessagePackParser(BaseParser):
+  """
+  Parses MessagePack request bodies into the same data a JSON body
+  would give.
+  """
+
+  media_type = 'application/msgpack'
+
+  def parse(self, stream, media_type=None, parser_context=None):
+    try:
+      return msgpack.unpackb(stream.read(), raw=False)
+    except (ValueError, TypeError, msgpack.UnpackException) as exc:
+      raise ParseError('MessagePack parse error - %s' % (str(exc) or exc.__class__.__name__))
@@ -0,0 +1,129 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, RelatedField
+
+from elearning.bases.fieldsets import prune
+from elearning.cache import LRUCache
+from elearning.conf import get_setting
+
+class PrefetchPlan(object):
+  """
+  Relations a serializer reads, found walking its fields once: forward
+  relations are joined with `select_related`, reverse and many to many
+  relations are loaded with one `Prefetch` per level, with its own plan.
+  Plans of sparse fieldsets also restrict the columns loaded with `only`.
+  """
+
+  def __init__(self, select_related=None, prefetch_related=None, only=None):
+    self.select_related = select_related or []
+    # (lookup, related model, plan of the related serializer)
+    self.prefetch_related = prefetch_related or []
+    # fields loaded, None for all of them
+    self.only = only
+
+  def __bool__(self):
+    return bool(self.select_related or self.prefetch_related or self.only is not None)
+
+  def prefixed(self, prefix):
+    return PrefetchPlan(
+      ['%s__%s' % (prefix, lookup) for lookup in self.select_related],
+      [('%s__%s' % (prefix, lookup), model, plan) for lookup, model, plan in self.prefetch_related],
+      None if self.only is None else ['%s__%s' % (prefix, name) for name in self.only]
+    )
+
+  def extend(self, plan):
+    self.select_related += plan.select_related
+    self.prefetch_related += plan.prefetch_related
+
+  def apply(self, queryset):
+    if self.only is not None:
+      queryset = queryset.only(*self.only)
+    if self.select_related:
+      queryset = queryset.select_related(*self.select_related)
+    if self.prefetch_related:
+      queryset = queryset.prefetch_related(*[
+        Prefetch(lookup, queryset=plan.apply(model._default_manager.all()))
+        for lookup, model, plan in self.prefetch_related
+      ])
+    return queryset
+
+def get_model_field(model, name):
+  try:
+    return model._meta.get_field(name)
+  except FieldDoesNotExist:
+    return None
+
+def build_plan(serializer, defer=False):
+  # with `defer`, only the columns the fields read are loaded
+  plan = PrefetchPlan()
+  model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+  if model is None:
+    return plan
+
+  only = [] if defer else None
+
+  for field in serializer.fields.values():
+    if field.write_only:
+      continue
+
+    if field.source == '*' or '.' in field.source:
+      # methods and properties may read any column
+      only = None
+      continue
+
+    model_field = get_model_field(model, field.source)
+    if model_field is None:
+      only = None
+      continue
+
+    if not model_field.is_relation:
+      if only is not None:
+        only.append(model_field.name)
+      continue
+
+    related_model = model_field.related_model
+
+    if isinstance(field, serializers.ListSerializer):
+      child = build_plan(field.child, defer)
+      if child.only is not None and model_field.one_to_many:
+        # the key joining the related objects to this one
+        child.only.append(model_field.field.name)
+      plan.prefetch_related.append((field.source, related_model, child))
+    elif isinstance(field, serializers.BaseSerializer):
+      child = build_plan(field, defer)
+      plan.select_related.append(field.source)
+      plan.extend(child.prefixed(field.source))
+      if child.only is None or not model_field.concrete:
+        only = None
+      elif only is not None:
+        only += [field.source] + child.prefixed(field.source).only
+    elif isinstance(field, ManyRelatedField):
+      plan.prefetch_related.append((field.source, related_model, PrefetchPlan()))
+    elif isinstance(field, RelatedField) and not field.use_pk_only_optimization():
+      plan.select_related.append(field.source)
+      only = None
+    elif only is not None:
+      only.append(model_field.name)
+
+  plan.only = only
+  return plan
+
+# plans by serializer class, serializers fields are the same for every
+# request, and by class and fieldset for sparse fieldsets
+_plans = {}
+_fieldset_plans = LRUCache(get_setting('FIELDSET_CACHE_SIZE'))
+
+def get_prefetch_plan(serializer_class, fieldset=None):
+  if fieldset is not None:
+    plan = _fieldset_plans.get((serializer_class, fieldset))
+    if plan is None:
+      plan = build_plan(prune(serializer_class(), fieldset), defer=True)
+      _fieldset_plans.set((serializer_class, fieldset), plan)
+    return plan
+
+  plan = _plans.get(serializer_class, None)
+  if plan is None:
+    plan = _plans[serializer_class] = build_plan(serializer_class())
+  return plan
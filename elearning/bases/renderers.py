@@ -0,0 +1,70 @@
+import re
+
+import msgpack
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+# numbers written with an exponent, python and orjson write them apart
+EXPONENT_RE = re.compile(rb'[:,\[]-?\d+(?:\.\d+)?e[-+]?\d')
+
+class FastJSONRenderer(JSONRenderer):
+  """
+  `JSONRenderer` encoding with orjson when it is installed, with the
+  same output byte for byte: types orjson would write its own way
+  (dates, times...) go through the encoder of the renderer, and data it
+  can not write the same way (floats with an exponent, integers beyond
+  64 bits, indented output...) falls back to the standard library.
+  Only non-finite floats differ, written null instead of failing.
+  """
+
+  options = orjson and (
+    orjson.OPT_PASSTHROUGH_DATETIME |
+    orjson.OPT_PASSTHROUGH_DATACLASS |
+    orjson.OPT_NON_STR_KEYS
+  )
+
+  def can_render_fast(self, accepted_media_type, renderer_context):
+    return (
+      orjson is not None and
+      self.compact and
+      not self.ensure_ascii and
+      self.get_indent(accepted_media_type, renderer_context) is None
+    )
+
+  def render(self, data, accepted_media_type=None, renderer_context=None):
+    if data is None or not self.can_render_fast(accepted_media_type, renderer_context or {}):
+      return super().render(data, accepted_media_type, renderer_context)
+
+    try:
+      ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+    except TypeError:
+      return super().render(data, accepted_media_type, renderer_context)
+
+    if EXPONENT_RE.search(ret):
+      return super().render(data, accepted_media_type, renderer_context)
+
+    # like JSONRenderer, escape the line separators javascript forbids in strings
+    return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+class MessagePackRenderer(BaseRenderer):
+  """
+  Renders data as MessagePack, smaller than JSON and faster to read on
+  devices. Types MessagePack has not, dates, decimals, uuids and lazy
+  texts, are written as the JSON renderer writes them.
+  """
+
+  media_type = 'application/msgpack'
+  format = 'msgpack'
+  charset = None
+  render_style = 'binary'
+
+  def render(self, data, accepted_media_type=None, renderer_context=None):
+    if data is None:
+      return b''
+    return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=True)
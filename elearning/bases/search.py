@@ -0,0 +1,239 @@
+import operator
+import re
+import threading
+import time
+
+from bisect import bisect_left, insort
+from functools import reduce
+
+from django.db import connections
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.signals import post_save, post_delete
+from django.utils.html import escape
+
+from rest_framework import filters
+
+from elearning.conf import get_setting
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+def tokenize(text):
+  return WORD_RE.findall(text.lower()) if text else []
+
+def highlight(text, words, size=None):
+  """
+  Escape `text` and wrap in <b> its words starting with any of `words`.
+  With a `size`, only the `size` words around the first match are kept.
+  """
+  if not text:
+    return text
+
+  words = tuple(words)
+  parts = re.split(r'(\w+)', text)
+  matches = [i for i in range(1, len(parts), 2) if parts[i].lower().startswith(words)]
+  matched = set(matches)
+
+  start, end, prefix, suffix = 0, len(parts), '', ''
+  if size and len(parts) // 2 > size:
+    first = matches[0] if matches else 1
+    # parts alternate separators and words, a word is two parts
+    start = max(0, first - size)
+    end = min(len(parts), start + size * 2)
+    prefix = '\u2026' if start > 0 else ''
+    suffix = '\u2026' if end < len(parts) else ''
+    start += start % 2
+
+  highlighted = ''.join(
+    '<b>%s</b>' % escape(part) if i in matched else escape(part)
+    for i, part in enumerate(parts[start:end], start)
+  )
+  return prefix + highlighted.strip() + suffix
+
+class InvertedIndex(object):
+  """
+  In-process inverted index of documents made of weighted fields. Terms
+  are kept sorted, so the terms starting with a prefix are found with a
+  binary search. Every word of a query must match, as a whole word or as
+  the prefix of one; documents are ranked by the weight of their matches,
+  whole words counting twice.
+  """
+
+  def __init__(self):
+    # term -> {document id: weight}
+    self.postings = {}
+    # sorted terms, for prefix lookups
+    self.terms = []
+    # document id -> its terms, to remove it
+    self.documents = {}
+    self._lock = threading.RLock()
+
+  def __len__(self):
+    return len(self.documents)
+
+  def add(self, doc_id, fields):
+    # fields: [(text, weight)]
+    with self._lock:
+      self.remove(doc_id)
+
+      weights = {}
+      for text, weight in fields:
+        for term in tokenize(text):
+          weights[term] = max(weights.get(term, 0), weight)
+
+      for term, weight in weights.items():
+        postings = self.postings.get(term)
+        if postings is None:
+          postings = self.postings[term] = {}
+          insort(self.terms, term)
+        postings[doc_id] = weight
+
+      self.documents[doc_id] = set(weights)
+
+  def remove(self, doc_id):
+    with self._lock:
+      for term in self.documents.pop(doc_id, ()):
+        postings = self.postings[term]
+        postings.pop(doc_id, None)
+        if not postings:
+          del self.postings[term]
+          del self.terms[bisect_left(self.terms, term)]
+
+  def match(self, word):
+    # document id -> score of the best term matching `word`
+    scores = {}
+    start = bisect_left(self.terms, word)
+    for term in self.terms[start:]:
+      if not term.startswith(word):
+        break
+      factor = 2 if term == word else 1
+      for doc_id, weight in self.postings[term].items():
+        score = weight * factor
+        if score > scores.get(doc_id, 0):
+          scores[doc_id] = score
+    return scores
+
+  def search(self, query, limit=None):
+    words = tokenize(query)
+    if not words:
+      return []
+
+    with self._lock:
+      # the longest words first, they match the fewest documents
+      words.sort(key=len, reverse=True)
+      scores = self.match(words[0])
+      for word in words[1:]:
+        if not scores:
+          break
+        matches = self.match(word)
+        scores = {doc_id: score + matches[doc_id] for doc_id, score in scores.items() if doc_id in matches}
+
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return ranked[:limit] if limit else ranked
+
+class ModelIndex(InvertedIndex):
+  """
+  Inverted index of the `fields` of a model, loaded from the database
+  when first searched and kept up to date by the signals of the model.
+  Changes made by other processes are picked up when the index is
+  loaded again, after `SEARCH_INDEX_TIMEOUT` seconds.
+  """
+
+  def __init__(self, model, fields):
+    super().__init__()
+    self.model = model
+    # the first fields weigh the most
+    self.fields = [(field, len(fields) - i) for i, field in enumerate(fields)]
+    self.loaded = None
+
+    post_save.connect(self.saved, sender=model, weak=False)
+    post_delete.connect(self.deleted, sender=model, weak=False)
+
+  def document(self, values):
+    return [(value, weight) for value, (field, weight) in zip(values, self.fields)]
+
+  def load(self):
+    with self._lock:
+      self.postings, self.terms, self.documents = {}, [], {}
+      names = [field for field, weight in self.fields]
+      for pk, *values in self.model._default_manager.values_list('pk', *names).iterator():
+        self.add(pk, self.document(values))
+      self.loaded = time.monotonic()
+
+  def ensure_loaded(self):
+    timeout = get_setting('SEARCH_INDEX_TIMEOUT')
+    if self.loaded is None or (timeout and time.monotonic() - self.loaded > timeout):
+      self.load()
+
+  def saved(self, sender, instance, raw=False, **kwargs):
+    if self.loaded is not None and not raw:
+      self.add(instance.pk, self.document([getattr(instance, field) for field, weight in self.fields]))
+
+  def deleted(self, sender, instance, **kwargs):
+    if self.loaded is not None:
+      self.remove(instance.pk)
+
+  def search(self, query, limit=None):
+    self.ensure_loaded()
+    return super().search(query, limit)
+
+# indexes by (model, fields)
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_model_index(model, fields):
+  key = (model, tuple(fields))
+  with _indexes_lock:
+    if key not in _indexes:
+      _indexes[key] = ModelIndex(model, fields)
+    return _indexes[key]
+
+class IndexedSearchFilter(filters.SearchFilter):
+  """
+  `SearchFilter` ordering results by relevance and backed by indexes:
+  trigram indexes on PostgreSQL (see the migrations), an in-process
+  `ModelIndex` on other databases, which returns the best
+  `SEARCH_RESULTS_LIMIT` results only.
+
+  Both match the same way: the query is split in words as the index
+  splits documents, and every word must match the start of a word of
+  one of the fields, case insensitively; `oth` does not find `Python`.
+  """
+
+  def get_search_field_names(self, view):
+    return [field.lstrip('^=@$') for field in getattr(view, 'search_fields', None) or ()]
+
+  def filter_queryset(self, request, queryset, view):
+    fields = self.get_search_field_names(view)
+    terms = self.get_search_terms(request)
+    if not fields or not terms:
+      return queryset
+
+    if connections[queryset.db].vendor == 'postgresql':
+      return self.filter_postgresql(request, queryset, view, fields, terms)
+
+    ranked = get_model_index(queryset.model, fields).search(' '.join(terms), get_setting('SEARCH_RESULTS_LIMIT'))
+    if not ranked:
+      return queryset.none()
+
+    return queryset.filter(pk__in=[pk for pk, score in ranked]).order_by(
+      Case(*[When(pk=pk, then=Value(position)) for position, (pk, score) in enumerate(ranked)]),
+    )
+
+  def filter_postgresql(self, request, queryset, view, fields, terms):
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    words = tokenize(' '.join(terms))
+    if not words:
+      return queryset.none()
+
+    # every word at the start of a word (\m) of any field, like the
+    # in-process index; the trigram indexes serve regular expressions too
+    for word in words:
+      queryset = queryset.filter(reduce(operator.or_, (Q(**{field + '__iregex': r'\m' + word}) for field in fields)))
+
+    query = ' '.join(words)
+    rank = sum(
+      (TrigramSimilarity(field, query) * (len(fields) - i) for i, field in enumerate(fields)),
+      Case(When(Q(**{fields[0] + '__istartswith': words[0]}), then=Value(1.0)), default=Value(0.0), output_field=FloatField())
+    )
+    return queryset.annotate(search_rank=rank).order_by('-search_rank', 'pk')
@@ -0,0 +1,150 @@
+import inspect
+import json
+import logging
+import threading
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import update_wrapper
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from elearning.conf import get_setting
+from elearning.constants import TASK_STATUS
+from elearning.models import Task
+
+logger = logging.getLogger(__name__)
+
+# task functions by name
+registry = {}
+
+class TaskFunction(object):
+  """
+  Function registered as a background task. Calling it runs it at once,
+  `apply_async` queues it on the task backend and returns the task id.
+  Functions accepting a `task_id` argument receive the id of their task.
+  """
+
+  def __init__(self, func, name=None):
+    update_wrapper(self, func)
+    self.func = func
+    self.name = name or '%s.%s' % (func.__module__, func.__name__)
+    self.accepts_task_id = 'task_id' in inspect.signature(func).parameters
+
+  def __call__(self, *args, **kwargs):
+    return self.func(*args, **kwargs)
+
+  def apply_async(self, args=None, kwargs=None, task_id=None, user=None):
+    return get_backend().enqueue(self, args or (), kwargs or {}, task_id=task_id, user=user)
+
+def task(func=None, name=None):
+  def decorator(func):
+    task_function = TaskFunction(func, name)
+    registry[task_function.name] = task_function
+    return task_function
+  return decorator(func) if func else decorator
+
+def set_progress(task_id, progress):
+  if task_id:
+    Task.objects.filter(pk=task_id).update(progress=json.dumps(progress, cls=DjangoJSONEncoder))
+
+class BaseTaskBackend(object):
+  """
+  Tasks are queued as rows of the Task table, so no broker is needed
+  and their status and result can be read from any process.
+  """
+
+  def enqueue(self, task_function, args, kwargs, task_id=None, user=None):
+    task = Task.objects.create(
+      id=task_id or uuid.uuid4(),
+      name=task_function.name,
+      args=json.dumps(list(args), cls=DjangoJSONEncoder),
+      kwargs=json.dumps(kwargs, cls=DjangoJSONEncoder),
+      user=user if user and user.pk else None
+    )
+    # workers must not see the task before the data it needs is commited
+    transaction.on_commit(lambda: self.submit(task.pk))
+    return task.pk
+
+  def submit(self, task_id):
+    raise NotImplementedError('`submit()` must be implemented.')
+
+  def run(self, task_id):
+    # claim the task, so it runs once whatever the number of workers
+    claimed = Task.objects.filter(pk=task_id, status=TASK_STATUS.PENDING) \
+      .update(status=TASK_STATUS.STARTED, started=timezone.now())
+    if not claimed:
+      return
+
+    task = Task.objects.get(pk=task_id)
+    try:
+      task_function = registry[task.name]
+      kwargs = json.loads(task.kwargs)
+      if task_function.accepts_task_id:
+        kwargs['task_id'] = task.pk
+
+      result = task_function(*json.loads(task.args), **kwargs)
+
+      task.result = json.dumps(result, cls=DjangoJSONEncoder)
+      task.status = TASK_STATUS.SUCCESS
+    except Exception as e:
+      logger.exception('Task %s %s failed', task.name, task.pk)
+      task.error = '%s: %s' % (e.__class__.__name__, e)
+      task.status = TASK_STATUS.FAILURE
+
+    task.finished = timezone.now()
+    task.save(update_fields=['result', 'status', 'error', 'finished'])
+
+  def run_pending(self, limit=None):
+    # run queued tasks in order, returns how many were found
+    pending = Task.objects.filter(status=TASK_STATUS.PENDING) \
+      .order_by('created').values_list('pk', flat=True)
+    if limit:
+      pending = pending[:limit]
+
+    task_ids = list(pending)
+    for task_id in task_ids:
+      self.run(task_id)
+    return len(task_ids)
+
+class LocalTaskBackend(BaseTaskBackend):
+  """
+  Run tasks in a pool of threads of the current process. With no workers
+  configured tasks stay queued until a `run_tasks` worker picks them.
+  """
+
+  def __init__(self):
+    workers = get_setting('TASK_WORKERS')
+    self.executor = ThreadPoolExecutor(max_workers=workers) if workers else None
+
+  def submit(self, task_id):
+    if self.executor:
+      self.executor.submit(self.run_in_thread, task_id)
+
+  def run_in_thread(self, task_id):
+    try:
+      self.run(task_id)
+    finally:
+      # connections opened by this thread
+      connections.close_all()
+
+class SyncTaskBackend(BaseTaskBackend):
+  """
+  Run tasks as soon as they are queued, useful for development and tests.
+  """
+
+  def submit(self, task_id):
+    self.run(task_id)
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend():
+  path = get_setting('TASK_BACKEND')
+  with _backends_lock:
+    if path not in _backends:
+      _backends[path] = import_string(path)()
+    return _backends[path]
@@ -0,0 +1,45 @@
+from django.db import connection
+
+def supports_upsert():
+  # INSERT ... ON CONFLICT DO UPDATE, from SQLite 3.24 onwards
+  if connection.vendor == 'postgresql':
+    return True
+  if connection.vendor == 'sqlite':
+    return connection.Database.sqlite_version_info >= (3, 24, 0)
+  return False
+
+def upsert(model, unique, fields, rows, batch_size=200):
+  """
+  Insert `rows` of `model`, or update the `fields` of the rows already
+  there with the same `unique` columns. Rows are tuples with the values
+  of `unique` then `fields`, by attribute name.
+  """
+  columns = list(unique) + list(fields)
+
+  if not supports_upsert():
+    for row in rows:
+      values = dict(zip(columns, row))
+      model.objects.update_or_create(
+        defaults={name: values[name] for name in fields},
+        **{name: values[name] for name in unique}
+      )
+    return
+
+  qn = connection.ops.quote_name
+  model_fields = [model._meta.get_field(name) for name in columns]
+  sql = 'INSERT INTO {table} ({columns}) VALUES {values} ON CONFLICT ({unique}) DO UPDATE SET {updates}'
+
+  with connection.cursor() as cursor:
+    for start in range(0, len(rows), batch_size):
+      batch = rows[start:start + batch_size]
+      params = []
+      for row in batch:
+        params += [field.get_db_prep_save(value, connection) for field, value in zip(model_fields, row)]
+
+      cursor.execute(sql.format(
+        table=qn(model._meta.db_table),
+        columns=', '.join(qn(field.column) for field in model_fields),
+        values=', '.join(['(%s)' % ', '.join(['%s'] * len(columns))] * len(batch)),
+        unique=', '.join(qn(model._meta.get_field(name).column) for name in unique),
+        updates=', '.join('{0} = EXCLUDED.{0}'.format(qn(model._meta.get_field(name).column)) for name in fields)
+      ), params)
@@ -1,14 +1,31 @@
+from django.core.exceptions import ValidationError
 from django.views import View
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db.models import Q, Count, Sum
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 from distutils.util import strtobool
 
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+from rest_framework.permissions import BasePermission
 from rest_framework.response import Response
 
+from elearning.bases.compiled import get_compiled_serializer
+from elearning.bases.fieldsets import parse_fieldset, prune
+from elearning.bases.prefetch import get_prefetch_plan
+from elearning.bases.renderers import FastJSONRenderer
+from elearning.conf import get_setting
+
 import django_filters
+import hashlib
 import operator
 
+from uuid import uuid4
+
 
 class ResponseClient(Response):
   """
@@ -43,12 +60,11 @@ class ViewBase(View):
     super().__init__(*args, **kwargs)
 
   @staticmethod
-  def async(method, is_async=False, *args, **kwargs):
+  def run_async(method, is_async=False, *args, user=None, **kwargs):
+    # `method` is a task, see elearning.bases.tasks
     if is_async:
-      task_id = uuid()
-      if not 'task_id' in kwargs:
-        kwargs['task_id'] = task_id
-      method.apply_async(args=args, kwargs=kwargs, task_id=task_id)
+      task_id = uuid4()
+      method.apply_async(args=args, kwargs=kwargs, task_id=task_id, user=user)
       return task_id
     else:
       return method(*args, **kwargs)
@@ -56,7 +72,11 @@ class ViewBase(View):
   @staticmethod
   def str2bool(v):
     v = 'f' if not v else v
-    return bool(strtobool(v.lower()))
+    try:
+      return bool(strtobool(v.lower()))
+    except ValueError:
+      # query parameters, a bad value is the client's error
+      raise ParseError('"%s" is not a valid boolean.' % v)
 
 class CharInFilter(django_filters.BaseInFilter, django_filters.CharFilter):
   pass
@@ -66,6 +86,66 @@ class StandardResultsSetPagination(PageNumberPagination):
   page_size_query_param = 'page_size'
   max_page_size = 100
 
+class KeysetPagination(CursorPagination):
+  """
+  Pagination on the primary key with opaque cursors: a page is an index
+  range scan, so any page costs the same than the first one. The total
+  is not counted unless `?count=true` is sent.
+  """
+  ordering = 'pk'
+  page_size_query_param = 'page_size'
+  max_page_size = 1000
+  count_query_param = 'count'
+
+  def paginate_queryset(self, queryset, request, view=None):
+    self.count = None
+    if ViewBase.str2bool(request.query_params.get(self.count_query_param)):
+      self.count = queryset.count()
+
+    return super().paginate_queryset(queryset, request, view)
+
+  def _get_position_from_instance(self, instance, ordering):
+    # rows of compiled serializers start with the primary key
+    if isinstance(instance, tuple):
+      return str(instance[0])
+    return super()._get_position_from_instance(instance, ordering)
+
+  def get_paginated_response(self, data):
+    response = OrderedDict()
+    if self.count is not None:
+      response['count'] = self.count
+    response['next'] = self.get_next_link()
+    response['previous'] = self.get_previous_link()
+    response['results'] = data
+    return Response(response)
+
+class SelectablePagination(BasePagination):
+  """
+  Page number pagination by default, keyset pagination when requested
+  with `?pagination=cursor` or when a cursor is sent.
+  """
+  page_number_class = PageNumberPagination
+  keyset_class = KeysetPagination
+
+  def __init__(self):
+    self.paginator = self.page_number_class()
+
+  def __getattr__(self, name):
+    return getattr(self.__dict__['paginator'], name)
+
+  def paginate_queryset(self, queryset, request, view=None):
+    if request.query_params.get('pagination') == 'cursor' or \
+      self.keyset_class.cursor_query_param in request.query_params:
+      self.paginator = self.keyset_class()
+
+    return self.paginator.paginate_queryset(queryset, request, view)
+
+  def get_paginated_response(self, data):
+    return self.paginator.get_paginated_response(data)
+
+  def to_html(self):
+    return self.paginator.to_html()
+
 class OtherLookupFieldMixin(object):
 
   def get_object(self):
@@ -84,4 +164,221 @@ class OtherLookupFieldMixin(object):
 
     # May raise a permission denied
     self.check_object_permissions(self.request, obj)
-    return obj
\ No newline at end of file
+    return obj
+
+def get_view_fieldset(view):
+  return view.get_fieldset() if hasattr(view, 'get_fieldset') else None
+
+class SparseFieldsMixin(object):
+  """
+  Let list and retrieve requests pick the fields of the serializer with
+  `?fields=` and its nested serializers with `?expand=`, see
+  elearning.bases.fieldsets. Prefetch plans and compiled serializers
+  follow the fieldset, so fields left out are not loaded either.
+  """
+  fieldset_actions = ('list', 'retrieve')
+
+  def get_fieldset(self):
+    if self.action not in self.fieldset_actions:
+      return None
+    params = self.request.query_params
+    return parse_fieldset(params.get('fields'), params.get('expand'))
+
+  def get_serializer(self, *args, **kwargs):
+    serializer = super().get_serializer(*args, **kwargs)
+
+    fieldset = self.get_fieldset()
+    if fieldset is not None:
+      prune(getattr(serializer, 'child', serializer), fieldset)
+
+    return serializer
+
+class PrefetchMixin(object):
+  """
+  Load in bulk the relations read by the serializer of the view,
+  instead of one query per related object and nesting level.
+  """
+  prefetch_actions = ('list', 'retrieve', 'update', 'partial_update')
+
+  def should_prefetch(self):
+    return self.action in self.prefetch_actions
+
+  def filter_queryset(self, queryset):
+    queryset = super().filter_queryset(queryset)
+
+    if self.should_prefetch():
+      queryset = get_prefetch_plan(self.get_serializer_class(), get_view_fieldset(self)).apply(queryset)
+
+    return queryset
+
+def filter_lookup(view, queryset):
+  # the object of the url, not found when its lookup value is invalid
+  # for the field, like rest_framework.generics.get_object_or_404
+  lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+  try:
+    return queryset.filter(**{view.lookup_field: view.kwargs[lookup_url_kwarg]})
+  except (TypeError, ValueError, ValidationError):
+    raise Http404
+
+class CompiledReadMixin(object):
+  """
+  Answer list and retrieve requests with the compiled version of the
+  serializer of the view, from rows instead of model instances. Views
+  whose serializer can not be compiled keep the regular path.
+  """
+
+  def get_compiled_serializer(self):
+    if not get_setting('COMPILED_SERIALIZERS') or self.action not in ('list', 'retrieve'):
+      return None
+    return get_compiled_serializer(self.get_serializer_class(), get_view_fieldset(self))
+
+  def should_prefetch(self):
+    return self.get_compiled_serializer() is None and super().should_prefetch()
+
+  def list(self, request, *args, **kwargs):
+    compiled = self.get_compiled_serializer()
+    if compiled is None:
+      return super().list(request, *args, **kwargs)
+
+    rows = compiled.rows(self.filter_queryset(self.get_queryset()))
+
+    page = self.paginate_queryset(rows)
+    if page is not None:
+      return self.get_paginated_response(compiled.render(page))
+
+    return Response(compiled.render(rows))
+
+  def retrieve(self, request, *args, **kwargs):
+    compiled = self.get_compiled_serializer()
+    # object permissions need an instance
+    if compiled is None or any(
+      type(permission).has_object_permission is not BasePermission.has_object_permission
+      for permission in self.get_permissions()
+    ):
+      return super().retrieve(request, *args, **kwargs)
+
+    queryset = filter_lookup(self, self.filter_queryset(self.get_queryset()))
+
+    data = compiled.serialize(queryset[:2])
+    if len(data) != 1:
+      raise Http404
+
+    return Response(data[0])
+
+class ConditionalGetMixin(object):
+  """
+  Validate list and retrieve requests with an ETag built from the
+  `version` of the objects, and answer 304 when the client already holds
+  them, before loading or serializing anything. Objects also send their
+  `updated_at` as Last-Modified; lists do not, deleting an object would
+  not move it, they are told apart by their count and versions.
+  """
+
+  def get_validator_variant(self, request):
+    # representations depend on the user kind, the url and the media type
+    user = request.user
+    return '%s:%s:%s:%s' % (
+      getattr(user, 'user_type', None),
+      getattr(user, 'is_staff', False),
+      request.get_full_path(),
+      getattr(request, 'accepted_media_type', '')
+    )
+
+  def conditional_response(self, request, state, updated_at, handler, *args, **kwargs):
+    variant = self.get_validator_variant(request)
+    etag = '"%s"' % hashlib.sha1(('%s|%s' % (variant, state)).encode('utf-8')).hexdigest()
+    last_modified = int(updated_at.timestamp()) if updated_at else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+      response = handler(request, *args, **kwargs)
+
+    if response.status_code in (200, 304):
+      response['ETag'] = etag
+      if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+      patch_vary_headers(response, ('Accept', 'Authorization', 'Cookie'))
+
+    return response
+
+  def list(self, request, *args, **kwargs):
+    state = self.filter_queryset(self.get_queryset()).aggregate(
+      count=Count('pk'),
+      versions=Sum('version')
+    )
+    state = (state['count'], state['versions'])
+
+    return self.conditional_response(request, state, None, super().list, *args, **kwargs)
+
+  def retrieve(self, request, *args, **kwargs):
+    state = filter_lookup(self, self.filter_queryset(self.get_queryset())) \
+      .values_list('pk', 'version', 'updated_at') \
+      .first()
+
+    if state is None:
+      return super().retrieve(request, *args, **kwargs)
+
+    return self.conditional_response(request, state, state[-1], super().retrieve, *args, **kwargs)
+
+class StreamingListMixin(object):
+  """
+  Stream list responses opted in with `?stream=json`, a JSON array, or
+  `?stream=ndjson`, a JSON object by line. Objects are read and serialized
+  in chunks walked by primary key, so the memory used does not grow with
+  the collection. Streams are neither paginated nor sorted but by pk.
+  """
+  stream_content_types = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+  }
+  stream_chunk_size = 1000
+
+  def list(self, request, *args, **kwargs):
+    stream = request.query_params.get('stream')
+    if not stream:
+      return super().list(request, *args, **kwargs)
+
+    if stream not in self.stream_content_types:
+      raise ParseError('stream must be one of %s.' % ', '.join(sorted(self.stream_content_types)))
+
+    lines = self.stream_lines(self.filter_queryset(self.get_queryset()), stream)
+    return StreamingHttpResponse(lines, content_type=self.stream_content_types[stream])
+
+  def stream_chunks(self, queryset):
+    # lists of serialized objects, chunk after chunk
+    compiled = self.get_compiled_serializer() if hasattr(self, 'get_compiled_serializer') else None
+    queryset = queryset.order_by('pk')
+    last = None
+
+    while True:
+      chunk = queryset if last is None else queryset.filter(pk__gt=last)
+
+      if compiled is not None:
+        rows = list(compiled.rows(chunk)[:self.stream_chunk_size])
+        pks = [row[0] for row in rows]
+        data = compiled.render(rows)
+      else:
+        objects = list(chunk[:self.stream_chunk_size])
+        pks = [obj.pk for obj in objects]
+        data = self.get_serializer(objects, many=True).data
+
+      if data:
+        yield data
+      if len(pks) < self.stream_chunk_size:
+        return
+      last = pks[-1]
+
+  def stream_lines(self, queryset, stream):
+    renderer = FastJSONRenderer()
+    separator = b'['
+
+    for data in self.stream_chunks(queryset):
+      for item in data:
+        if stream == 'ndjson':
+          yield renderer.render(item) + b'\n'
+        else:
+          yield separator + renderer.render(item)
+          separator = b','
+
+    if stream == 'json':
+      yield b'[]' if separator == b'[' else b']'
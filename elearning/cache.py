@@ -0,0 +1,63 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+class LRUCache(object):
+  """
+  Thread safe in-process cache holding at most `maxsize` entries,
+  the least recently used ones are discarded first. With a `timeout`
+  entries also expire that many seconds after being set. `on_discard`
+  is called with the key and value of entries evicted or expired.
+  """
+
+  def __init__(self, maxsize=128, timeout=None, on_discard=None):
+    self.maxsize = maxsize
+    self.timeout = timeout
+    self.on_discard = on_discard
+    # key -> (expiration time or None, value)
+    self._data = OrderedDict()
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return len(self._data)
+
+  def get(self, key, default=None):
+    with self._lock:
+      try:
+        self._data.move_to_end(key)
+      except KeyError:
+        return default
+      expires, value = self._data[key]
+      if expires is None or expires > time.monotonic():
+        return value
+      del self._data[key]
+
+    self.discarded([(key, value)])
+    return default
+
+  def set(self, key, value):
+    expires = time.monotonic() + self.timeout if self.timeout else None
+    discarded = []
+    with self._lock:
+      self._data[key] = (expires, value)
+      self._data.move_to_end(key)
+      while len(self._data) > self.maxsize:
+        old_key, (old_expires, old_value) = self._data.popitem(last=False)
+        discarded.append((old_key, old_value))
+
+    self.discarded(discarded)
+
+  def discarded(self, entries):
+    # called out of the lock, callbacks may use the cache
+    if self.on_discard is not None:
+      for key, value in entries:
+        self.on_discard(key, value)
+
+  def delete(self, key):
+    with self._lock:
+      self._data.pop(key, None)
+
+  def clear(self):
+    with self._lock:
+      self._data.clear()
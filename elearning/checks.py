@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from elearning.conf import get_setting
+
+# cache backends keeping their data in each process
+LOCAL_CACHE_BACKENDS = (
+  'django.core.cache.backends.locmem.LocMemCache',
+  'django.core.cache.backends.dummy.DummyCache',
+)
+
+def is_shared(alias):
+  backend = settings.CACHES.get(alias, {}).get('BACKEND') if alias else None
+  return bool(backend) and backend not in LOCAL_CACHE_BACKENDS
+
+@register()
+def revocation_cache_check(app_configs, **kwargs):
+  # revoked access tokens must be seen by every process, or a logout on
+  # one of them leaves the token valid on the others until it expires
+  authentication_classes = getattr(settings, 'REST_FRAMEWORK', {}).get('DEFAULT_AUTHENTICATION_CLASSES', ())
+  if 'elearning.authentication.SignedTokenAuthentication' not in authentication_classes:
+    return []
+
+  if is_shared(get_setting('ACCESS_TOKEN_REVOCATION_CACHE')):
+    return []
+
+  return [Warning(
+    'Revoked access tokens are not shared between processes.',
+    hint='Set ELEARNING["ACCESS_TOKEN_REVOCATION_CACHE"] to a cache shared by every process, '
+         'like memcached or the database cache.',
+    id='elearning.W001',
+  )]
+
+@register()
+def leaderboard_cache_check(app_configs, **kwargs):
+  # without shared versions, a process only sees the scores saved by the
+  # others when its leaderboards expire
+  if is_shared(get_setting('LEADERBOARD_CACHE')):
+    return []
+
+  return [Warning(
+    'Leaderboard versions are not shared between processes.',
+    hint='Set ELEARNING["LEADERBOARD_CACHE"] to a cache shared by every process, like memcached or '
+         'the database cache, or scores saved by the others show up after LEADERBOARD_CACHE_TIMEOUT seconds.',
+    id='elearning.W002',
+  )]
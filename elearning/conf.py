@@ -0,0 +1,56 @@
+from django.conf import settings
+
+DEFAULTS = {
+  # compiled answer keys kept in memory by each process
+  'ANSWER_KEY_CACHE_SIZE': 1024,
+  # alias of a django cache shared by all processes, None to disable it
+  'ANSWER_KEY_SHARED_CACHE': None,
+  'ANSWER_KEY_SHARED_CACHE_TIMEOUT': 60 * 60,
+  # 'compact' keeps selected answers in LessonStudent.answers only,
+  # 'rows' also keeps the legacy AnswerStudent rows in sync
+  'SUBMISSION_STORAGE': 'compact',
+  # submissions accepted by a single batch request
+  'BATCH_SUBMISSION_MAX_SIZE': 1000,
+  # dotted path of the backend running background tasks
+  'TASK_BACKEND': 'elearning.bases.tasks.LocalTaskBackend',
+  # threads running tasks in each process, 0 leaves them to `run_tasks`
+  'TASK_WORKERS': 4,
+  # acknowledge select_answers at once and grade in background
+  'DEFERRED_GRADING': False,
+  # answer read only requests from rows, see elearning.bases.compiled
+  'COMPILED_SERIALIZERS': True,
+  # authenticated tokens kept in memory by each process, and for how long
+  'TOKEN_CACHE_SIZE': 10000,
+  'TOKEN_CACHE_TIMEOUT': 60,
+  # seconds signed access tokens are valid, see elearning.authentication
+  'ACCESS_TOKEN_LIFETIME': 15 * 60,
+  # alias of a django cache sharing revoked access tokens between all
+  # processes, None keeps them in each process only
+  'ACCESS_TOKEN_REVOCATION_CACHE': 'default',
+  # results of a search on in-process indexes, and seconds before
+  # they are loaded again, see elearning.bases.search
+  'SEARCH_RESULTS_LIMIT': 500,
+  'SEARCH_INDEX_TIMEOUT': 5 * 60,
+  # django cache of lesson statistics, and seconds they are kept for
+  'LESSON_STATS_CACHE': 'default',
+  'LESSON_STATS_TIMEOUT': 5 * 60,
+  # leaderboards kept in memory by each process and seconds before they
+  # are loaded again, and the django cache sharing their versions, see
+  # elearning.leaderboards
+  'LEADERBOARD_CACHE_SIZE': 256,
+  'LEADERBOARD_CACHE_TIMEOUT': 60,
+  'LEADERBOARD_CACHE': 'default',
+  # prefetch plans and compiled serializers of the sparse fieldsets asked
+  # with `?fields=` and `?expand=`, kept by each process
+  'FIELDSET_CACHE_SIZE': 256,
+  # gzipped course syllabuses kept in memory by each process, see
+  # elearning.syllabus
+  'SYLLABUS_CACHE_SIZE': 64,
+}
+
+def get_setting(name):
+  """
+  Get an elearning setting, overridable from the `ELEARNING` dict
+  in the project settings.
+  """
+  return getattr(settings, 'ELEARNING', {}).get(name, DEFAULTS[name])
@@ -15,3 +15,13 @@ class RESPONSE_TYPE:
   ERROR = "ERROR"
   WARNING = "WARNING"
   INFO = "INFO"
+
+class TASK_STATUS:
+  PENDING = 1
+  STARTED = 2
+  SUCCESS = 3
+  FAILURE = 4
+
+class SYLLABUS_AUDIENCE:
+  STUDENT = 1
+  STAFF = 2
@@ -0,0 +1,61 @@
+import csv
+import json
+
+from itertools import groupby
+
+from elearning.models import Lesson, LessonStudent
+
+class Echo(object):
+  # file-like object handing back what csv writes to it
+  def write(self, value):
+    return value
+
+def gradebook(course, chunk_size=2000):
+  """
+  Lessons of `course` and a generator of its students with their scores
+  by lesson, pivoted from LessonStudent rows read in chunks through a
+  server-side cursor, so memory does not grow with the students.
+  """
+  lessons = list(Lesson.objects.filter(course=course).order_by('pk').values_list('pk', 'title'))
+
+  rows = LessonStudent.objects.filter(lesson__course=course) \
+    .order_by('student_id', 'lesson_id') \
+    .values_list('student_id', 'student__username', 'lesson_id', 'score') \
+    .iterator(chunk_size=chunk_size)
+
+  def students():
+    for (student_id, username), student_rows in groupby(rows, key=lambda row: row[:2]):
+      scores = {lesson_id: score for student, name, lesson_id, score in student_rows}
+      yield student_id, username, scores
+
+  return lessons, students()
+
+def gradebook_csv(course, chunk_size=2000):
+  # lines of the gradebook as CSV, a column by lesson
+  lessons, students = gradebook(course, chunk_size)
+  writer = csv.writer(Echo())
+
+  yield writer.writerow(['student', 'username'] + [title for pk, title in lessons] + ['total'])
+  for student_id, username, scores in students:
+    yield writer.writerow(
+      [student_id, username] +
+      [scores.get(pk) for pk, title in lessons] +
+      [sum(score or 0 for score in scores.values())]
+    )
+
+def gradebook_jsonl(course, chunk_size=2000):
+  # lines of the gradebook as JSON objects, scores by lesson id
+  lessons, students = gradebook(course, chunk_size)
+
+  for student_id, username, scores in students:
+    yield json.dumps({
+      'student': student_id,
+      'username': username,
+      'scores': {str(pk): scores.get(pk) for pk, title in lessons},
+      'total': sum(score or 0 for score in scores.values())
+    }) + '\n'
+
+EXPORT_FORMATS = {
+  'csv': (gradebook_csv, 'text/csv'),
+  'jsonl': (gradebook_jsonl, 'application/x-ndjson'),
+}
@@ -0,0 +1,110 @@
+from django.core.cache import caches
+
+from elearning.bases.models import touch
+from elearning.cache import LRUCache
+from elearning.conf import get_setting
+from elearning.constants import QUESTION_TYPE
+from elearning.models import Lesson, Answer
+
+# A question is passed when the number of correct answers selected by the
+# student satisfies the rule of its type, given the number of correct
+# answers the question has.
+QUESTION_RULES = {
+  QUESTION_TYPE.BOOLEAN: lambda selected, total: selected > 0,
+  QUESTION_TYPE.ONE: lambda selected, total: selected > 0,
+  QUESTION_TYPE.MORE_THAN_ONE: lambda selected, total: selected > 1,
+  QUESTION_TYPE.MORE_THAN_ONE_ALL: lambda selected, total: selected == total,
+}
+
+class AnswerKey(object):
+  """
+  Answer key of a lesson compiled into plain dicts, so any submission
+  can be graded in memory without touching the database.
+  """
+
+  def __init__(self, lesson_id, rows, version=None):
+    self.lesson_id = lesson_id
+    self.version = version
+    # answer id -> (question id, is correct)
+    self.answers = {}
+    # question id -> [type, score, number of correct answers]
+    self.questions = {}
+
+    for answer_id, question_id, is_correct, question_type, question_score in rows:
+      self.answers[answer_id] = (question_id, is_correct)
+      question = self.questions.setdefault(question_id, [question_type, question_score or 0, 0])
+      if is_correct:
+        question[2] += 1
+
+  def __contains__(self, answer_id):
+    return answer_id in self.answers
+
+  @property
+  def answer_ids(self):
+    return self.answers.keys()
+
+  def invalid(self, answer_ids):
+    # answers sent that do not belong to the lesson
+    return [pk for pk in answer_ids if pk not in self.answers]
+
+  def question_scores(self, answer_ids):
+    # count correct answers selected for each answered question
+    selected = {}
+    for pk in set(answer_ids):
+      answer = self.answers.get(pk)
+      if answer is None:
+        continue
+      question_id, is_correct = answer
+      selected[question_id] = selected.get(question_id, 0) + int(is_correct)
+
+    scores = {}
+    for question_id, selected_correct in selected.items():
+      question_type, score, total_correct = self.questions[question_id]
+      rule = QUESTION_RULES[question_type]
+      scores[question_id] = score if rule(selected_correct, total_correct) else 0
+
+    return scores
+
+  def grade(self, answer_ids):
+    return sum(self.question_scores(answer_ids).values())
+
+def answer_key_rows(lesson_id):
+  return Answer.objects.filter(question__lesson=lesson_id).values_list(
+    'pk', 'question_id', 'is_correct', 'question__type', 'question__score'
+  )
+
+def load_answer_key(lesson_id):
+  # a single query for the whole lesson, whatever its number of questions
+  return AnswerKey(lesson_id, answer_key_rows(lesson_id))
+
+# compiled answer keys of this process, by lesson id
+answer_keys = LRUCache(get_setting('ANSWER_KEY_CACHE_SIZE'))
+
+def get_answer_key(lesson):
+  """
+  Get the answer key of `lesson` for its current version, looking up
+  the process cache first, then the shared cache and the database last.
+  """
+  answer_key = answer_keys.get(lesson.pk)
+  if answer_key is not None and answer_key.version == lesson.version:
+    return answer_key
+
+  alias = get_setting('ANSWER_KEY_SHARED_CACHE')
+  shared_cache = caches[alias] if alias else None
+  cache_key = 'elearning:answer-key:%s:%s' % (lesson.pk, lesson.version)
+
+  rows = shared_cache.get(cache_key) if shared_cache else None
+  if rows is None:
+    rows = list(answer_key_rows(lesson.pk))
+    if shared_cache:
+      shared_cache.set(cache_key, rows, get_setting('ANSWER_KEY_SHARED_CACHE_TIMEOUT'))
+
+  answer_key = AnswerKey(lesson.pk, rows, version=lesson.version)
+  answer_keys.set(lesson.pk, answer_key)
+
+  return answer_key
+
+def invalidate_answer_key(lesson_id):
+  # a new version makes every cached key of the lesson unreachable
+  touch(Lesson, pk=lesson_id)
+  answer_keys.delete(lesson_id)
@@ -0,0 +1,135 @@
+from bisect import bisect_left, insort
+import threading
+
+from django.core.cache import caches
+
+from elearning.cache import LRUCache
+from elearning.conf import get_setting
+from elearning.models import LessonStudent, CourseProgress
+
+class Leaderboard(object):
+  """
+  Scores of the students of a course or a lesson kept as a sorted array
+  of (-score, student id), so ranks are found with a binary search and
+  a score changes with a single insertion. Students with the same score
+  share the same rank.
+  """
+
+  def __init__(self, rows=()):
+    # student id -> score
+    self.scores = dict(rows)
+    self.keys = sorted((-score, student_id) for student_id, score in self.scores.items())
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return len(self.keys)
+
+  def update(self, student_id, score):
+    with self._lock:
+      self._remove(student_id)
+      if score is not None:
+        self.scores[student_id] = score
+        insort(self.keys, (-score, student_id))
+
+  def remove(self, student_id):
+    with self._lock:
+      self._remove(student_id)
+
+  def _remove(self, student_id):
+    score = self.scores.pop(student_id, None)
+    if score is not None:
+      del self.keys[bisect_left(self.keys, (-score, student_id))]
+
+  def rank_of_score(self, score):
+    # students with a higher score, plus one
+    return bisect_left(self.keys, (-score, float('-inf'))) + 1
+
+  def rank(self, student_id):
+    score = self.scores.get(student_id)
+    return None if score is None else self.rank_of_score(score)
+
+  def entries(self, start, stop):
+    # (rank, student id, score) of the positions [start, stop)
+    keys = self.keys[max(0, start):max(0, stop)]
+    return [(self.rank_of_score(-score), student_id, -score) for score, student_id in keys]
+
+  def top(self, limit):
+    return self.entries(0, limit)
+
+  def around(self, student_id, size):
+    # `size` students before and after `student_id`, itself included
+    score = self.scores.get(student_id)
+    if score is None:
+      return []
+    position = bisect_left(self.keys, (-score, student_id))
+    return self.entries(position - size, position + size + 1)
+
+# Leaderboards are loaded from the database (LessonStudent scores for
+# lessons, CourseProgress scores for courses) and updated as submissions
+# are saved. Each one has a version in a shared django cache, bumped on
+# every change: a process whose leaderboard is behind loads it again.
+# Whatever the cache, leaderboards are loaded again after
+# `LEADERBOARD_CACHE_TIMEOUT` seconds, updates in place do not delay it.
+
+SOURCES = {
+  'course': lambda pk: CourseProgress.objects.filter(course=pk).values_list('student_id', 'score'),
+  'lesson': lambda pk: LessonStudent.objects.filter(lesson=pk, score__isnull=False).values_list('student_id', 'score'),
+}
+
+# [version, leaderboard] by (scope, id)
+leaderboards = LRUCache(get_setting('LEADERBOARD_CACHE_SIZE'), get_setting('LEADERBOARD_CACHE_TIMEOUT'))
+
+def version_key(scope, pk):
+  return 'elearning:leaderboard:%s:%s' % (scope, pk)
+
+def shared_cache():
+  return caches[get_setting('LEADERBOARD_CACHE')]
+
+def get_leaderboard(scope, pk):
+  version = shared_cache().get(version_key(scope, pk), 0)
+
+  entry = leaderboards.get((scope, pk))
+  if entry is not None and entry[0] == version:
+    return entry[1]
+
+  # the version read before loading, a change meanwhile loads it again
+  leaderboard = Leaderboard(SOURCES[scope](pk))
+  leaderboards.set((scope, pk), [version, leaderboard])
+  return leaderboard
+
+def bump(scope, pk):
+  # new version of a leaderboard, None when it had none yet
+  cache = shared_cache()
+  try:
+    return cache.incr(version_key(scope, pk))
+  except ValueError:
+    cache.add(version_key(scope, pk), 1, None)
+    return None
+
+def invalidate(scope, pk):
+  bump(scope, pk)
+  leaderboards.delete((scope, pk))
+
+def record_scores(scope, scores):
+  """
+  Apply new `scores`, (id, student id, score), to the leaderboards of
+  this process and bump their versions for the other ones.
+  """
+  by_board = {}
+  for pk, student_id, score in scores:
+    by_board.setdefault(pk, []).append((student_id, score))
+
+  for pk, board_scores in by_board.items():
+    version = bump(scope, pk)
+    entry = leaderboards.get((scope, pk))
+    if entry is None:
+      continue
+
+    # only the previous version can be updated in place, the entry keeps
+    # its expiration
+    if version is not None and entry[0] == version - 1:
+      for student_id, score in board_scores:
+        entry[1].update(student_id, score)
+      entry[0] = version
+    else:
+      leaderboards.delete((scope, pk))
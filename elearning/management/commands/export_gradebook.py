@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from elearning.gradebook import EXPORT_FORMATS
+from elearning.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Export the scores of every student in every lesson of a course.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, required=True)
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', help='File to write, standard output by default.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(pk=options['course'])
+        except Course.DoesNotExist:
+            raise CommandError('Course %s does not exist.' % options['course'])
+
+        export, content_type = EXPORT_FORMATS[options['format']]
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+
+        try:
+            for line in export(course, chunk_size=options['chunk_size']):
+                output.write(line)
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from elearning.models import Course
+from elearning.progress import rebuild_course_progress
+
+
+class Command(BaseCommand):
+    help = 'Aggregate again the progress of every student in courses from their submissions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', default=[], help='Course id, repeatable. All courses by default.')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.order_by('pk')
+        if options['course']:
+            courses = courses.filter(pk__in=options['course'])
+
+        for course_id in courses.values_list('pk', flat=True):
+            students = rebuild_course_progress(course_id)
+            self.stdout.write(self.style.SUCCESS('Course %s: progress of %s students rebuilt' % (course_id, students)))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from elearning.models import Course, Lesson
+from elearning.regrading import regrade_lesson
+
+
+class Command(BaseCommand):
+    help = 'Grade again the submissions of lessons or courses against their current answer keys.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lesson', type=int, action='append', default=[], help='Lesson id, repeatable.')
+        parser.add_argument('--course', type=int, action='append', default=[], help='Course id, repeatable.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--processes', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if not options['lesson'] and not options['course']:
+            raise CommandError('At least one --lesson or --course is required.')
+
+        lessons = Lesson.objects.filter(pk__in=options['lesson']) | \
+            Lesson.objects.filter(course__in=Course.objects.filter(pk__in=options['course']))
+
+        for lesson in lessons.order_by('pk'):
+            def progress(graded, changed):
+                self.stdout.write('lesson %s: %s graded, %s changed' % (lesson.pk, graded, changed))
+
+            graded, changed = regrade_lesson(
+                lesson,
+                chunk_size=options['chunk_size'],
+                processes=options['processes'],
+                progress=progress
+            )
+
+            self.stdout.write(self.style.SUCCESS(
+                'Lesson %s regraded: %s submissions, %s scores changed' % (lesson.pk, graded, changed)
+            ))
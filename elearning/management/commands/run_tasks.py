@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from elearning.bases.tasks import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Run the background tasks queued in the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait on an empty queue.')
+        parser.add_argument('--batch', type=int, default=100)
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+
+        while True:
+            count = backend.run_pending(limit=options['batch'])
+            if count:
+                self.stdout.write('%s tasks run' % count)
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.5 on 2026-10-18 17:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elearning', '0005_auto_20190912_1427'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.5 on 2026-10-18 17:05
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def remove_duplicates(apps, schema_editor):
+    # keep the last row saved of each pair before adding the constraints
+    for model_name, fields in (('LessonStudent', ('lesson', 'student')),
+                               ('AnswerStudent', ('answer', 'student'))):
+        model = apps.get_model('elearning', model_name)
+        duplicates = model.objects.values(*fields) \
+            .annotate(last=Max('id'), count=Count('id')) \
+            .filter(count__gt=1) \
+            .order_by()
+        for row in duplicates.iterator():
+            model.objects.filter(**{f: row[f] for f in fields}) \
+                .exclude(id=row['last']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elearning', '0006_lesson_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='answerstudent',
+            unique_together={('answer', 'student')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='lessonstudent',
+            unique_together={('lesson', 'student')},
+        ),
+    ]
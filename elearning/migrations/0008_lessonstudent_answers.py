@@ -0,0 +1,41 @@
+# Generated by Django 2.2.5 on 2026-10-18 17:05
+
+from itertools import groupby
+
+from django.db import migrations
+import elearning.bases.fields
+
+
+def copy_answer_students(apps, schema_editor):
+    # fold the AnswerStudent rows of each (student, lesson) into LessonStudent
+    LessonStudent = apps.get_model('elearning', 'LessonStudent')
+    AnswerStudent = apps.get_model('elearning', 'AnswerStudent')
+
+    rows = AnswerStudent.objects \
+        .order_by('student_id', 'answer__question__lesson_id') \
+        .values_list('student_id', 'answer__question__lesson_id', 'answer_id') \
+        .iterator(chunk_size=10000)
+
+    for (student_id, lesson_id), group in groupby(rows, key=lambda row: row[:2]):
+        answers = tuple(row[2] for row in group)
+        updated = LessonStudent.objects \
+            .filter(student_id=student_id, lesson_id=lesson_id) \
+            .update(answers=answers)
+        if not updated:
+            LessonStudent.objects.create(student_id=student_id, lesson_id=lesson_id, answers=answers)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elearning', '0007_submission_unique_together'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessonstudent',
+            name='answers',
+            field=elearning.bases.fields.IdSetField(blank=True, default=tuple),
+        ),
+        migrations.RunPython(copy_answer_students, migrations.RunPython.noop),
+    ]
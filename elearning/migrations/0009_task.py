@@ -0,0 +1,39 @@
+# Generated by Django 2.2.5 on 2026-10-18 17:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+import elearning.bases.models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elearning', '0008_lessonstudent_answers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=150)),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'pending'), (2, 'started'), (3, 'success'), (4, 'failure')], default=1)),
+                ('args', models.TextField(default='[]')),
+                ('kwargs', models.TextField(default='{}')),
+                ('result', models.TextField(blank=True, null=True)),
+                ('progress', models.TextField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='task_user', to='elearning.User')),
+            ],
+            options={
+                'verbose_name': 'task',
+                'verbose_name_plural': 'tasks',
+                'index_together': {('status', 'created')},
+            },
+            bases=(models.Model, elearning.bases.models.ModelBase),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+SEARCH_FIELDS = ('username', 'email', 'first_name', 'last_name')
+
+
+def create_indexes(apps, schema_editor):
+    # trigram indexes serve the icontains lookups of user search,
+    # other databases search an in-process index, see elearning.bases.search
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS elearning_user_%s_trgm '
+            'ON elearning_user USING gin (%s gin_trgm_ops)' % (field, field)
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for field in SEARCH_FIELDS:
+        schema_editor.execute('DROP INDEX IF EXISTS elearning_user_%s_trgm' % field)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elearning', '0010_content_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
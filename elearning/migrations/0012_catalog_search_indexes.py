@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# the same expression searched by elearning.search
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+)
+
+TABLES = ('elearning_course', 'elearning_lesson')
+
+
+def create_indexes(apps, schema_editor):
+    # other databases search an in-process index, see elearning.bases.search
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for table in TABLES:
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS %s_search ON %s USING gin ((%s))' % (table, table, SEARCH_VECTOR)
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for table in TABLES:
+        schema_editor.execute('DROP INDEX IF EXISTS %s_search' % table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elearning', '0011_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
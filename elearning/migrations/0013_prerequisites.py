@@ -0,0 +1,65 @@
+# Generated by Django 2.2.5 on 2026-10-18 17:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+import elearning.bases.models
+
+
+def build_closures(apps, schema_editor):
+    # walk the chain of previous of every course and lesson once
+    for model_name, closure_name in (('Course', 'CoursePrerequisite'),
+                                     ('Lesson', 'LessonPrerequisite')):
+        model = apps.get_model('elearning', model_name)
+        closure = apps.get_model('elearning', closure_name)
+        previous = dict(model.objects.values_list('pk', 'previous_id'))
+
+        rows = []
+        for pk in previous:
+            ancestor, depth, seen = pk, 0, set()
+            # a cycle ends the chain where it closes
+            while ancestor is not None and ancestor not in seen:
+                seen.add(ancestor)
+                rows.append(closure(ancestor_id=ancestor, descendant_id=pk, depth=depth))
+                ancestor, depth = previous.get(ancestor), depth + 1
+        closure.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elearning', '0012_catalog_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonPrerequisite',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lessonprerequisite_ancestor', to='elearning.Lesson')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lessonprerequisite_descendant', to='elearning.Lesson')),
+            ],
+            options={
+                'verbose_name': 'lesson_prerequisite',
+                'verbose_name_plural': 'lesson_prerequisites',
+                'unique_together': {('ancestor', 'descendant')},
+            },
+            bases=(models.Model, elearning.bases.models.ModelBase),
+        ),
+        migrations.CreateModel(
+            name='CoursePrerequisite',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='courseprerequisite_ancestor', to='elearning.Course')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='courseprerequisite_descendant', to='elearning.Course')),
+            ],
+            options={
+                'verbose_name': 'course_prerequisite',
+                'verbose_name_plural': 'course_prerequisites',
+                'unique_together': {('ancestor', 'descendant')},
+            },
+            bases=(models.Model, elearning.bases.models.ModelBase),
+        ),
+        migrations.RunPython(build_closures, migrations.RunPython.noop),
+    ]
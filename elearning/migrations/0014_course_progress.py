@@ -0,0 +1,59 @@
+# Generated by Django 2.2.5 on 2026-10-18 17:21
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+import django.db.models.deletion
+import elearning.bases.models
+
+
+def build_progress(apps, schema_editor):
+    LessonStudent = apps.get_model('elearning', 'LessonStudent')
+    CourseProgress = apps.get_model('elearning', 'CourseProgress')
+
+    approved = Q(lesson__approval_score__isnull=True) | Q(score__gte=F('lesson__approval_score'))
+    rows = LessonStudent.objects.values('lesson__course', 'student') \
+        .annotate(passed=Count('pk', filter=approved), total=Sum('score')) \
+        .order_by()
+
+    CourseProgress.objects.bulk_create([
+        CourseProgress(
+            course_id=row['lesson__course'],
+            student_id=row['student'],
+            lessons_passed=row['passed'],
+            score=row['total'] or 0
+        )
+        for row in rows.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elearning', '0013_prerequisites'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessonstudent',
+            name='submitted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='CourseProgress',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lessons_passed', models.PositiveIntegerField(default=0)),
+                ('score', models.IntegerField(default=0)),
+                ('last_activity', models.DateTimeField(blank=True, null=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='courseprogress_course', to='elearning.Course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='courseprogress_student', to='elearning.User')),
+            ],
+            options={
+                'verbose_name': 'course_progress',
+                'verbose_name_plural': 'course_progresses',
+                'unique_together': {('course', 'student')},
+            },
+            bases=(models.Model, elearning.bases.models.ModelBase),
+        ),
+        migrations.RunPython(build_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.5 on 2026-10-18 17:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+import elearning.bases.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elearning', '0014_course_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('audience', models.PositiveSmallIntegerField(choices=[(1, 'student'), (2, 'staff')])),
+                ('content', models.BinaryField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coursesnapshot_course', to='elearning.Course')),
+            ],
+            options={
+                'verbose_name': 'course_snapshot',
+                'verbose_name_plural': 'course_snapshots',
+                'unique_together': {('course', 'version', 'audience')},
+            },
+            bases=(models.Model, elearning.bases.models.ModelBase),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import ugettext_lazy as _
@@ -5,7 +7,8 @@ from django.utils.translation import ugettext_lazy as _
 from rest_framework.validators import UniqueValidator
 
 from elearning.bases.models import ModelBase
-from elearning.constants import USER_TYPE, QUESTION_TYPE
+from elearning.bases.fields import IdSetField
+from elearning.constants import USER_TYPE, QUESTION_TYPE, TASK_STATUS, SYLLABUS_AUDIENCE
 
 USER_TYPE_CHOICES = (
   (USER_TYPE.STUDENT, 'student'),
@@ -20,6 +23,18 @@ QUESTION_TYPE_CHOICES = (
   (QUESTION_TYPE.MORE_THAN_ONE_ALL, 'more_than_one_all')
 )
 
+TASK_STATUS_CHOICES = (
+  (TASK_STATUS.PENDING, 'pending'),
+  (TASK_STATUS.STARTED, 'started'),
+  (TASK_STATUS.SUCCESS, 'success'),
+  (TASK_STATUS.FAILURE, 'failure'),
+)
+
+SYLLABUS_AUDIENCE_CHOICES = (
+  (SYLLABUS_AUDIENCE.STUDENT, 'student'),
+  (SYLLABUS_AUDIENCE.STAFF, 'staff'),
+)
+
 class User(AbstractUser, ModelBase):
   user_type = models.PositiveSmallIntegerField(
     choices=USER_TYPE_CHOICES, 
@@ -66,6 +81,14 @@ class Course(models.Model, ModelBase):
     null=True,
     on_delete=models.CASCADE
   )
+  # bumped whenever it or its lessons change
+  version = models.PositiveIntegerField(
+    default=1,
+    editable=False
+  )
+  updated_at = models.DateTimeField(
+    auto_now=True
+  )
 
 class Lesson(models.Model, ModelBase):
   class Meta:
@@ -109,6 +132,58 @@ class Lesson(models.Model, ModelBase):
     null=True,
     on_delete=models.CASCADE
   )
+  # bumped whenever it, its questions or its answers change
+  version = models.PositiveIntegerField(
+    default=1,
+    editable=False
+  )
+  updated_at = models.DateTimeField(
+    auto_now=True
+  )
+
+class CoursePrerequisite(models.Model, ModelBase):
+  """
+  Closure of `Course.previous`: a row for each course and each of its
+  prerequisites, direct or not, `depth` links away. Every course is its
+  own prerequisite at depth 0. Maintained by elearning.prerequisites.
+  """
+  class Meta:
+    verbose_name = _('course_prerequisite')
+    verbose_name_plural = _('course_prerequisites')
+    unique_together = ('ancestor', 'descendant')
+
+  ancestor = models.ForeignKey(
+    Course,
+    related_name='courseprerequisite_ancestor',
+    on_delete=models.CASCADE
+  )
+  descendant = models.ForeignKey(
+    Course,
+    related_name='courseprerequisite_descendant',
+    on_delete=models.CASCADE
+  )
+  depth = models.PositiveIntegerField()
+
+class LessonPrerequisite(models.Model, ModelBase):
+  """
+  Closure of `Lesson.previous`, see `CoursePrerequisite`.
+  """
+  class Meta:
+    verbose_name = _('lesson_prerequisite')
+    verbose_name_plural = _('lesson_prerequisites')
+    unique_together = ('ancestor', 'descendant')
+
+  ancestor = models.ForeignKey(
+    Lesson,
+    related_name='lessonprerequisite_ancestor',
+    on_delete=models.CASCADE
+  )
+  descendant = models.ForeignKey(
+    Lesson,
+    related_name='lessonprerequisite_descendant',
+    on_delete=models.CASCADE
+  )
+  depth = models.PositiveIntegerField()
 
 class Question(models.Model, ModelBase):
   class Meta:
@@ -142,6 +217,14 @@ class Question(models.Model, ModelBase):
     related_name='question_teacher',
     on_delete=models.CASCADE
   )
+  # bumped whenever it or its answers change
+  version = models.PositiveIntegerField(
+    default=1,
+    editable=False
+  )
+  updated_at = models.DateTimeField(
+    auto_now=True
+  )
 
 class Answer(models.Model, ModelBase):
   class Meta:
@@ -164,11 +247,20 @@ class Answer(models.Model, ModelBase):
     related_name='answers',
     on_delete=models.CASCADE
   )
+  # bumped whenever it changes
+  version = models.PositiveIntegerField(
+    default=1,
+    editable=False
+  )
+  updated_at = models.DateTimeField(
+    auto_now=True
+  )
 
 class LessonStudent(models.Model, ModelBase):
   class Meta:
     verbose_name = _('lesson_student')
     verbose_name_plural = _('lesson_students')
+    unique_together = ('lesson', 'student')
 
   lesson = models.ForeignKey(
     Lesson, 
@@ -184,11 +276,83 @@ class LessonStudent(models.Model, ModelBase):
     null=True, 
     blank=True
   )
+  # ids of the answers selected, replaces one AnswerStudent row per answer
+  answers = IdSetField(
+    blank=True
+  )
+  submitted_at = models.DateTimeField(
+    blank=True,
+    null=True
+  )
+
+  def get_answers(self):
+    return Answer.objects.filter(pk__in=self.answers)
+
+  def get_answer_students(self):
+    # unsaved rows, for readers still expecting one AnswerStudent per answer
+    return [AnswerStudent(answer_id=pk, student_id=self.student_id) for pk in self.answers]
+
+class CourseProgress(models.Model, ModelBase):
+  """
+  Progress of a student in a course, aggregated from its LessonStudent
+  rows whenever they are saved, see elearning.progress.
+  """
+  class Meta:
+    verbose_name = _('course_progress')
+    verbose_name_plural = _('course_progresses')
+    unique_together = ('course', 'student')
+
+  course = models.ForeignKey(
+    Course,
+    related_name='courseprogress_course',
+    on_delete=models.CASCADE
+  )
+  student = models.ForeignKey(
+    User,
+    related_name='courseprogress_student',
+    on_delete=models.CASCADE
+  )
+  lessons_passed = models.PositiveIntegerField(
+    default=0
+  )
+  score = models.IntegerField(
+    default=0
+  )
+  last_activity = models.DateTimeField(
+    blank=True,
+    null=True
+  )
+
+class CourseSnapshot(models.Model, ModelBase):
+  """
+  Syllabus of a course, its lessons with their questions and answers,
+  rendered once by course version and audience as gzipped JSON, see
+  elearning.syllabus.
+  """
+  class Meta:
+    verbose_name = _('course_snapshot')
+    verbose_name_plural = _('course_snapshots')
+    unique_together = ('course', 'version', 'audience')
+
+  course = models.ForeignKey(
+    Course,
+    related_name='coursesnapshot_course',
+    on_delete=models.CASCADE
+  )
+  version = models.PositiveIntegerField()
+  audience = models.PositiveSmallIntegerField(
+    choices=SYLLABUS_AUDIENCE_CHOICES
+  )
+  content = models.BinaryField()
+  created = models.DateTimeField(
+    auto_now_add=True
+  )
 
 class AnswerStudent(models.Model, ModelBase):
   class Meta:
     verbose_name = _('lesson_student')
     verbose_name_plural = _('lesson_students')
+    unique_together = ('answer', 'student')
 
   answer = models.ForeignKey(
     Answer, 
@@ -200,3 +364,62 @@ class AnswerStudent(models.Model, ModelBase):
     related_name='answerstudent_student',
     on_delete=models.CASCADE
   )
+
+class Task(models.Model, ModelBase):
+  class Meta:
+    verbose_name = _('task')
+    verbose_name_plural = _('tasks')
+    index_together = (('status', 'created'),)
+
+  def __str__(self):
+    return '%s %s' % (self.name, self.id)
+
+  id = models.UUIDField(
+    primary_key=True,
+    default=uuid.uuid4,
+    editable=False
+  )
+  name = models.CharField(
+    max_length=150
+  )
+  status = models.PositiveSmallIntegerField(
+    choices=TASK_STATUS_CHOICES,
+    default=TASK_STATUS.PENDING
+  )
+  # json encoded arguments, result and progress
+  args = models.TextField(
+    default='[]'
+  )
+  kwargs = models.TextField(
+    default='{}'
+  )
+  result = models.TextField(
+    blank=True,
+    null=True
+  )
+  progress = models.TextField(
+    blank=True,
+    null=True
+  )
+  error = models.TextField(
+    blank=True,
+    null=True
+  )
+  user = models.ForeignKey(
+    User,
+    related_name='task_user',
+    blank=True,
+    null=True,
+    on_delete=models.SET_NULL
+  )
+  created = models.DateTimeField(
+    auto_now_add=True
+  )
+  started = models.DateTimeField(
+    blank=True,
+    null=True
+  )
+  finished = models.DateTimeField(
+    blank=True,
+    null=True
+  )
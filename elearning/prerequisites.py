@@ -0,0 +1,91 @@
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Value, CharField
+
+from elearning.models import Course, Lesson, CoursePrerequisite, LessonPrerequisite, LessonStudent
+from elearning.progress import APPROVED
+
+# Courses and lessons form chains through `previous`. Their closure tables
+# hold every (prerequisite, dependent) pair, so the whole chain of any of
+# them is a single indexed lookup instead of a walk one link at a time.
+
+CLOSURES = {
+  Course: CoursePrerequisite,
+  Lesson: LessonPrerequisite,
+}
+
+def creates_cycle(model, pk, previous_id):
+  # `previous_id` is `pk` itself or depends on it
+  if previous_id is None or pk is None:
+    return False
+  return previous_id == pk or CLOSURES[model].objects.filter(ancestor=pk, descendant=previous_id).exists()
+
+def link(model, pk, previous_id):
+  """
+  Make `previous_id` the previous of `pk` in the closure of `model`,
+  moving along every course or lesson depending on `pk`.
+  """
+  closure = CLOSURES[model]
+
+  with transaction.atomic():
+    closure.objects.get_or_create(ancestor_id=pk, descendant_id=pk, defaults={'depth': 0})
+
+    subtree = list(closure.objects.filter(ancestor=pk).values_list('descendant_id', 'depth'))
+    ids = [descendant for descendant, depth in subtree]
+
+    # forget the prerequisites out of the subtree, then add the new ones
+    closure.objects.filter(descendant__in=ids).exclude(ancestor__in=ids).delete()
+
+    if previous_id is not None:
+      ancestors = closure.objects.filter(descendant=previous_id).values_list('ancestor_id', 'depth')
+      closure.objects.bulk_create([
+        closure(ancestor_id=ancestor, descendant_id=descendant, depth=ancestor_depth + depth + 1)
+        for ancestor, ancestor_depth in ancestors
+        for descendant, depth in subtree
+      ])
+
+def approved_lessons(student, lesson):
+  # submissions of `student` approving `lesson`, an outer reference
+  return LessonStudent.objects.filter(APPROVED, student=student, lesson=lesson)
+
+def unlocked_lessons(student, lessons=None):
+  """
+  Lessons whose prerequisites have all been approved by `student`.
+  """
+  blocking = LessonPrerequisite.objects.filter(descendant=OuterRef('pk'), depth__gt=0) \
+    .annotate(approved=Exists(approved_lessons(student, OuterRef('ancestor')))) \
+    .filter(approved=False)
+
+  lessons = Lesson.objects.all() if lessons is None else lessons
+  return lessons.annotate(blocked=Exists(blocking)).filter(blocked=False)
+
+def unlocked_courses(student, courses=None):
+  """
+  Courses whose prerequisite courses have all their lessons approved
+  by `student`.
+  """
+  pending_lessons = Lesson.objects.filter(course=OuterRef('ancestor')) \
+    .annotate(approved=Exists(approved_lessons(student, OuterRef('pk')))) \
+    .filter(approved=False)
+  blocking = CoursePrerequisite.objects.filter(descendant=OuterRef('pk'), depth__gt=0) \
+    .annotate(pending=Exists(pending_lessons)) \
+    .filter(pending=True)
+
+  courses = Course.objects.all() if courses is None else courses
+  return courses.annotate(blocked=Exists(blocking)).filter(blocked=False)
+
+def unlocked(student, courses=None, lessons=None):
+  """
+  Courses and lessons `student` can take, in a single query: a lesson
+  needs its course unlocked too. Rows are (type, id, title, course id).
+  """
+  courses = unlocked_courses(student, courses)
+  lessons = unlocked_lessons(student, lessons).filter(course__in=courses.values('pk'))
+
+  # columns named apart on both sides, a name given twice maps to one column
+  return courses.annotate(type=Value('course', output_field=CharField()), course_ref=F('pk')) \
+    .values_list('type', 'pk', 'title', 'course_ref') \
+    .union(
+      lessons.annotate(type=Value('lesson', output_field=CharField()), course_ref=F('course_id'))
+        .values_list('type', 'pk', 'title', 'course_ref'),
+      all=True
+    )
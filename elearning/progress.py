@@ -0,0 +1,47 @@
+from django.db.models import Count, F, Max, Q, Sum
+
+from elearning.bases.upsert import upsert
+from elearning.leaderboards import invalidate
+from elearning.models import Lesson, LessonStudent, CourseProgress
+
+# a LessonStudent row approving its lesson
+APPROVED = Q(lesson__approval_score__isnull=True) | Q(score__gte=F('lesson__approval_score'))
+
+def aggregate(submissions):
+  # (course id, student id, lessons passed, score, last activity)
+  return submissions.values_list('lesson__course', 'student') \
+    .annotate(passed=Count('pk', filter=APPROVED), total=Sum('score'), last=Max('submitted_at')) \
+    .order_by()
+
+def save_progress(rows):
+  # returns the rows saved, (course id, student id, lessons passed, score, last activity)
+  rows = [(course_id, student_id, passed, total or 0, last) for course_id, student_id, passed, total, last in rows]
+  upsert(
+    CourseProgress,
+    ('course_id', 'student_id'),
+    ('lessons_passed', 'score', 'last_activity'),
+    rows
+  )
+  return rows
+
+def refresh_progress(lesson_ids, student_ids):
+  """
+  Aggregate again the progress of `student_ids` in the courses of
+  `lesson_ids`, after saving their submissions. It runs in the
+  transaction of the caller, so progress and submissions are saved
+  together.
+  """
+  courses = Lesson.objects.filter(pk__in=set(lesson_ids)).values('course')
+  return save_progress(list(aggregate(
+    LessonStudent.objects.filter(lesson__course__in=courses, student__in=set(student_ids))
+  )))
+
+def rebuild_course_progress(course_id):
+  # progress of every student of a course, removing students left without submissions
+  rows = list(aggregate(LessonStudent.objects.filter(lesson__course=course_id)))
+  CourseProgress.objects.filter(course=course_id) \
+    .exclude(student__in=[student_id for course, student_id, *values in rows]) \
+    .delete()
+  save_progress(rows)
+  invalidate('course', course_id)
+  return len(rows)
@@ -0,0 +1,105 @@
+from itertools import islice
+from functools import partial
+from multiprocessing import Pool
+
+from django.db import connection, connections, transaction
+from django.db.transaction import TransactionManagementError
+
+from elearning.analytics import invalidate_lesson_stats
+from elearning.grading import get_answer_key
+from elearning.models import Lesson, LessonStudent
+from elearning.leaderboards import invalidate
+from elearning.progress import refresh_progress
+
+def chunked(iterable, size):
+  iterator = iter(iterable)
+  chunk = list(islice(iterator, size))
+  while chunk:
+    yield chunk
+    chunk = list(islice(iterator, size))
+
+def grade_chunk(answer_key, rows):
+  # rows of (LessonStudent id, answers, score), returns how many rows
+  # were graded and the scores changed
+  changed = []
+  for pk, answers, score in rows:
+    new_score = answer_key.grade(answers)
+    if new_score != score:
+      changed.append((pk, new_score))
+  return len(rows), changed
+
+def pool_results(pool, grade, chunks, batch_size):
+  # chunks are read here, batch by batch: the pool would read them from
+  # its feeder thread, and the cursor from a connection of that thread
+  for batch in chunked(chunks, batch_size):
+    yield from pool.imap(grade, batch)
+
+def regrade_lesson(lesson, chunk_size=2000, processes=1, progress=None):
+  """
+  Grade again every submission of `lesson` against its current answer key,
+  reading them in chunks through a server-side cursor. Chunks are graded
+  by a pool of `processes` when greater than one, and `progress` is called
+  with the number of submissions graded and changed after each chunk.
+  Returns both numbers.
+
+  Workers can not run inside an atomic block: the connections of the
+  process are closed before starting them.
+  """
+  if processes > 1 and connection.in_atomic_block:
+    raise TransactionManagementError("Submissions can't be regraded by several processes inside an atomic block.")
+
+  answer_key = get_answer_key(lesson)
+
+  rows = LessonStudent.objects.filter(lesson=lesson).order_by('pk') \
+    .values_list('pk', 'answers', 'score') \
+    .iterator(chunk_size=chunk_size)
+  chunks = chunked(rows, chunk_size)
+  grade = partial(grade_chunk, answer_key)
+
+  pool = None
+  if processes > 1:
+    # workers only grade, they must not share the parent connections
+    connections.close_all()
+    pool = Pool(processes)
+    results = pool_results(pool, grade, chunks, processes * 2)
+  else:
+    results = map(grade, chunks)
+
+  graded = changed = 0
+  try:
+    for count, scores in results:
+      if scores:
+        with transaction.atomic():
+          LessonStudent.objects.bulk_update(
+            [LessonStudent(pk=pk, score=score) for pk, score in scores],
+            ['score']
+          )
+          students = LessonStudent.objects.filter(pk__in=[pk for pk, score in scores]) \
+            .values_list('student_id', flat=True)
+          refresh_progress([lesson.pk], students)
+      graded += count
+      changed += len(scores)
+      if progress:
+        progress(graded, changed)
+  finally:
+    if pool:
+      pool.close()
+      pool.join()
+
+  if changed:
+    invalidate('lesson', lesson.pk)
+    invalidate('course', lesson.course_id)
+    invalidate_lesson_stats([lesson.pk])
+
+  return graded, changed
+
+def regrade_course(course, **kwargs):
+  # every lesson of the course, one after the other
+  progress = kwargs.pop('progress', None)
+  graded = changed = 0
+  for lesson in Lesson.objects.filter(course=course).order_by('pk'):
+    lesson_progress = (lambda g, c: progress(graded + g, changed + c)) if progress else None
+    lesson_graded, lesson_changed = regrade_lesson(lesson, progress=lesson_progress, **kwargs)
+    graded += lesson_graded
+    changed += lesson_changed
+  return graded, changed
@@ -0,0 +1,84 @@
+from django.db import connections
+
+from elearning.bases.search import tokenize, highlight, get_model_index
+from elearning.conf import get_setting
+from elearning.constants import USER_TYPE
+from elearning.models import Course, Lesson
+
+# Catalog search: courses and lessons by title and description, titles
+# weighing the most. PostgreSQL matches and ranks the same tsvector its
+# GIN indexes are built on (see the migrations), other databases search
+# in-process indexes maintained on save, see elearning.bases.search.
+
+SEARCH_FIELDS = ('title', 'description')
+
+SEARCH_VECTOR = (
+  "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+  "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+)
+
+# words of snippets around the first match
+SNIPPET_SIZE = 30
+
+CATALOG = (
+  ('course', Course, 'pk'),
+  ('lesson', Lesson, 'course_id'),
+)
+
+def visible(model, user):
+  # the same objects the course and lesson viewsets list
+  queryset = model._default_manager.all()
+  if user.user_type == USER_TYPE.STUDENT:
+    queryset = queryset.filter(opened=True)
+  return queryset
+
+def ranked_rows(queryset, query, limit, course):
+  # (pk, course id, title, description, rank), the best first
+  columns = ('pk', course) + SEARCH_FIELDS
+
+  if connections[queryset.db].vendor == 'postgresql':
+    tsquery = ' & '.join('%s:*' % word for word in tokenize(query))
+    return queryset.extra(
+      select={'search_rank': "ts_rank(%s, to_tsquery('simple', %%s))" % SEARCH_VECTOR},
+      select_params=[tsquery],
+      where=["%s @@ to_tsquery('simple', %%s)" % SEARCH_VECTOR],
+      params=[tsquery]
+    ).order_by('-search_rank', 'pk').values_list(*columns + ('search_rank',))[:limit]
+
+  ranked = get_model_index(queryset.model, SEARCH_FIELDS).search(query)
+  rows = []
+  # the index knows nothing about visibility, look up ranked ids in chunks
+  # until enough of them are visible
+  for start in range(0, len(ranked), limit):
+    chunk = ranked[start:start + limit]
+    found = {row[0]: row for row in queryset.filter(pk__in=[pk for pk, score in chunk]).values_list(*columns)}
+    rows += [found[pk] + (score,) for pk, score in chunk if pk in found]
+    if len(rows) >= limit:
+      break
+  return rows[:limit]
+
+def search_catalog(query, user):
+  """
+  Courses and lessons visible to `user` matching every word of `query`,
+  as hits with highlighted snippets, the most relevant first.
+  """
+  words = tokenize(query)
+  if not words:
+    return []
+
+  limit = get_setting('SEARCH_RESULTS_LIMIT')
+  hits = []
+
+  for kind, model, course in CATALOG:
+    for pk, course_id, title, description, rank in ranked_rows(visible(model, user), query, limit, course):
+      hits.append({
+        'type': kind,
+        'id': pk,
+        'course': course_id,
+        'title': highlight(title, words),
+        'snippet': highlight(description, words, SNIPPET_SIZE),
+        'score': float(rank),
+      })
+
+  hits.sort(key=lambda hit: -hit['score'])
+  return hits[:limit]
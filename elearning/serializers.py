@@ -1,3 +1,5 @@
+import json
+
 from django.utils.translation import ugettext_lazy as _
 
 from rest_framework_friendly_errors.mixins import FriendlyErrorMessagesMixin
@@ -7,8 +9,10 @@ from rest_framework.authentication import authenticate
 from drf_writable_nested import WritableNestedModelSerializer
 
 from elearning.bases.serializers import SerializerBase, SerializerModelBase, NestedPrimaryKeyRelatedField
-from elearning.models import User, Course, Lesson, Question, Answer, AnswerStudent
+from elearning.models import User, Course, Lesson, Question, Answer, AnswerStudent, CourseProgress, Task
+from elearning.conf import get_setting
 from elearning.constants import USER_TYPE
+from elearning.prerequisites import creates_cycle
 
 class UserSerializer(SerializerModelBase):
   password = serializers.CharField(
@@ -134,6 +138,13 @@ class LessonSerializer(SerializerModelBase):
     model = Lesson
     fields = Lesson().get_fields() + ('questions',)
 
+  def validate_previous(self, value):
+    # friendly errors run it again on the initial data, a pk
+    previous_id = getattr(value, 'pk', value)
+    if previous_id is not None and self.instance is not None and creates_cycle(Lesson, self.instance.pk, previous_id):
+      raise serializers.ValidationError(_('Prerequisites can not form a cycle.'))
+    return value
+
 class BasicLessonSerializer(LessonSerializer):
   teacher_set = serializers.HiddenField(write_only=True, default=serializers.CurrentUserDefault())
   teacher = serializers.PrimaryKeyRelatedField(read_only=True, default=serializers.CurrentUserDefault())
@@ -146,30 +157,75 @@ class BasicLessonSerializer(LessonSerializer):
     validated_data['teacher'] = validated_data.pop('teacher_set')
     return Lesson.objects.create(**validated_data)
  
-class LessonAnswerPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
-  def get_queryset(self):
-    queryset = super().get_queryset()
-    if not queryset:
-      return None
+class AnswerSyllabusSerializer(AnswerSerializer):
+  class Meta(AnswerSerializer.Meta):
+    fields = list(AnswerSerializer.Meta.fields)
+    fields.remove('question')
 
-    view = self.context.get('view', None)
-    if not view:
-      return None
+class QuestionSyllabusSerializer(QuestionLessonSerializer):
+  answers = AnswerSyllabusSerializer(read_only=True, many=True)
 
-    pk = view.kwargs.get('pk', None)
-    
-    if pk and queryset:
-      return queryset.filter(question__lesson=pk)
-    elif queryset:
-      return queryset
+class LessonSyllabusSerializer(LessonSerializer):
+  # questions with their correct answers, for teachers and admins
+  questions = QuestionSyllabusSerializer(read_only=True, many=True)
 
-class LessonAnswersSerializer(SerializerModelBase):
-  answers = LessonAnswerPrimaryKeyRelatedField(queryset=Answer.objects, many=True) 
+class LessonAnswersSerializer(SerializerBase):
+  answers = serializers.ListField(child=serializers.IntegerField(), allow_empty=True)
 
-  class Meta:
-    model = Answer
-    fields = ('answers',)
+  def validate_answers(self, value):
+    # validate against the lesson answer key, without querying each answer
+    answer_key = self.context.get('answer_key', None)
+
+    if answer_key is not None:
+      for pk in answer_key.invalid(value):
+        raise serializers.ValidationError(
+          _('Invalid pk "%s" - object does not exist.') % pk
+        )
+
+    return list(dict.fromkeys(value))
    
+class BatchSubmissionSerializer(SerializerBase):
+  """
+  Answers of a student for a lesson inside a batch, validated against
+  the lessons, students and answer keys loaded once for the whole batch.
+  """
+  student = serializers.IntegerField()
+  lesson = serializers.IntegerField()
+  answers = serializers.ListField(child=serializers.IntegerField(), allow_empty=True)
+
+  def validate_student(self, value):
+    if value not in self.context['students']:
+      raise serializers.ValidationError(_('Invalid pk "%s" - object does not exist.') % value)
+    return value
+
+  def validate_lesson(self, value):
+    lesson = self.context['lessons'].get(value, None)
+    if lesson is None:
+      raise serializers.ValidationError(_('Invalid pk "%s" - object does not exist.') % value)
+    return lesson
+
+  def validate_answers(self, value):
+    # same rules than a single submission, an unknown lesson is reported apart
+    try:
+      lesson_pk = self.fields['lesson'].to_internal_value(self.initial_data.get('lesson'))
+    except serializers.ValidationError:
+      return value
+
+    answer_key = self.context['answer_keys'].get(lesson_pk, None)
+    rules = LessonAnswersSerializer(context={'answer_key': answer_key})
+    return rules.validate_answers(value)
+
+  def validate(self, attrs):
+    attrs['answer_key'] = self.context['answer_keys'][attrs['lesson'].pk]
+    return attrs
+
+class BatchSubmissionsSerializer(SerializerBase):
+  # items are validated one by one, their errors reported by index
+  submissions = serializers.ListField(
+    allow_empty=False,
+    max_length=get_setting('BATCH_SUBMISSION_MAX_SIZE')
+  )
+
 class CourseSerializer(SerializerModelBase):
   teacher = serializers.PrimaryKeyRelatedField(queryset=User.objects.filter(user_type=USER_TYPE.TEACHER))
 
@@ -177,6 +233,13 @@ class CourseSerializer(SerializerModelBase):
     model = Course
     fields = Course().get_fields()
 
+  def validate_previous(self, value):
+    # friendly errors run it again on the initial data, a pk
+    previous_id = getattr(value, 'pk', value)
+    if previous_id is not None and self.instance is not None and creates_cycle(Course, self.instance.pk, previous_id):
+      raise serializers.ValidationError(_('Prerequisites can not form a cycle.'))
+    return value
+
 class BasicCourseSerializer(CourseSerializer):
   teacher_set = serializers.HiddenField(write_only=True, default=serializers.CurrentUserDefault())
   teacher = serializers.PrimaryKeyRelatedField(read_only=True, default=serializers.CurrentUserDefault())
@@ -187,4 +250,36 @@ class BasicCourseSerializer(CourseSerializer):
 
   def create(self, validated_data):
     validated_data['teacher'] = validated_data.pop('teacher_set')
-    return Course.objects.create(**validated_data)
\ No newline at end of file
+    return Course.objects.create(**validated_data)
+
+class TaskSerializer(SerializerModelBase):
+  status = serializers.CharField(source='get_status_display', read_only=True)
+  result = serializers.SerializerMethodField()
+  progress = serializers.SerializerMethodField()
+
+  class Meta:
+    model = Task
+    fields = ('id', 'name', 'status', 'progress', 'result', 'error', 'created', 'started', 'finished')
+    read_only_fields = fields
+
+  def get_result(self, obj):
+    return json.loads(obj.result) if obj.result else None
+
+  def get_progress(self, obj):
+    return json.loads(obj.progress) if obj.progress else None
+
+class SearchHitSerializer(SerializerBase):
+  type = serializers.CharField(read_only=True)
+  id = serializers.IntegerField(read_only=True)
+  course = serializers.IntegerField(read_only=True)
+  title = serializers.CharField(read_only=True)
+  snippet = serializers.CharField(read_only=True)
+  score = serializers.FloatField(read_only=True)
+
+class CourseProgressSerializer(SerializerModelBase):
+  course_title = serializers.CharField(source='course.title', read_only=True)
+
+  class Meta:
+    model = CourseProgress
+    fields = ('course', 'course_title', 'lessons_passed', 'score', 'last_activity')
+    read_only_fields = fields
@@ -0,0 +1,132 @@
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from elearning.authentication import tokens
+from elearning.bases.models import touch
+from elearning.grading import invalidate_answer_key
+from elearning.prerequisites import creates_cycle, link
+from elearning.progress import rebuild_course_progress
+from elearning.models import User, Course, Lesson, Question, Answer
+
+# Content is versioned: saving a course, lesson, question or answer bumps
+# its version, and the versions of the objects embedding it. Any change
+# on questions or answers makes the answer key of their lessons stale.
+# Questions or answers moved to another lesson leave the previous one
+# stale too, so the lesson loaded before saving is kept.
+
+def lesson_changed(lesson_id):
+  invalidate_answer_key(lesson_id)
+  touch(Course, lesson_course=lesson_id)
+
+@receiver(pre_save, sender=Course)
+@receiver(pre_save, sender=Lesson)
+@receiver(pre_save, sender=Question)
+@receiver(pre_save, sender=Answer)
+def content_pre_save(sender, instance, raw=False, **kwargs):
+  # bumped by the database, a version read before saving may be stale
+  if not instance._state.adding and not raw:
+    instance.version = F('version') + 1
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Question)
+@receiver(post_save, sender=Answer)
+def content_post_save(sender, instance, **kwargs):
+  if hasattr(instance.version, 'resolve_expression'):
+    instance.refresh_from_db(fields=['version'])
+
+@receiver(pre_save, sender=Question)
+def question_pre_save(sender, instance, **kwargs):
+  instance._previous_lesson_id = Question.objects.filter(pk=instance.pk) \
+    .values_list('lesson_id', flat=True).first() if instance.pk else None
+
+@receiver(pre_save, sender=Answer)
+def answer_pre_save(sender, instance, **kwargs):
+  instance._previous_lesson_id = Answer.objects.filter(pk=instance.pk) \
+    .values_list('question__lesson_id', flat=True).first() if instance.pk else None
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def lesson_saved(sender, instance, **kwargs):
+  # a lesson moved to another course changes the previous one too
+  saved = getattr(instance, '_saved', {})
+  for course_id in {instance.course_id, saved.get('course_id')}:
+    if course_id:
+      touch(Course, pk=course_id)
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+  for lesson_id in {instance.lesson_id, getattr(instance, '_previous_lesson_id', None)}:
+    if lesson_id:
+      lesson_changed(lesson_id)
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def answer_changed(sender, instance, **kwargs):
+  touch(Question, pk=instance.question_id)
+
+  lesson_id = Question.objects.filter(pk=instance.question_id) \
+    .values_list('lesson_id', flat=True).first()
+
+  for lesson_id in {lesson_id, getattr(instance, '_previous_lesson_id', None)}:
+    if lesson_id:
+      lesson_changed(lesson_id)
+
+# Cached tokens hold their user: deleting a token, or saving or deleting
+# its user (deactivated, type changed...), evicts it from this process.
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+  tokens.delete(instance.key)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+  tokens.delete_user(instance.pk)
+
+# Closures of Course.previous and Lesson.previous follow their changes,
+# chains can not be closed into cycles.
+
+# fields of courses and lessons compared with their saved values
+SAVED_FIELDS = {
+  Course: ('previous_id',),
+  Lesson: ('previous_id', 'course_id', 'approval_score'),
+}
+
+@receiver(pre_save, sender=Course)
+@receiver(pre_save, sender=Lesson)
+def prerequisite_pre_save(sender, instance, raw=False, **kwargs):
+  fields = SAVED_FIELDS[sender]
+  values = sender.objects.filter(pk=instance.pk).values_list(*fields).first() if instance.pk else None
+  instance._saved = dict(zip(fields, values or (None,) * len(fields)))
+
+  if not raw and creates_cycle(sender, instance.pk, instance.previous_id):
+    raise ValidationError({'previous': 'Prerequisites can not form a cycle.'})
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Lesson)
+def prerequisite_saved(sender, instance, created=False, raw=False, **kwargs):
+  if not raw and (created or instance.previous_id != instance._saved['previous_id']):
+    link(sender, instance.pk, instance.previous_id)
+
+# Course progress counts approved lessons: changing the approval score
+# of a lesson, moving it or deleting it changes the progress of every
+# student of its courses.
+
+@receiver(post_save, sender=Lesson)
+def lesson_progress_saved(sender, instance, created=False, raw=False, **kwargs):
+  saved = instance._saved
+  if raw or created:
+    return
+  if instance.approval_score != saved['approval_score'] or instance.course_id != saved['course_id']:
+    for course_id in {instance.course_id, saved['course_id']}:
+      rebuild_course_progress(course_id)
+
+@receiver(post_delete, sender=Lesson)
+def lesson_progress_deleted(sender, instance, **kwargs):
+  rebuild_course_progress(instance.course_id)
@@ -0,0 +1,90 @@
+from django.db import transaction
+from django.utils import timezone
+
+from elearning.analytics import invalidate_lesson_stats
+from elearning.bases.upsert import upsert
+from elearning.conf import get_setting
+from elearning.leaderboards import record_scores
+from elearning.models import LessonStudent, AnswerStudent
+from elearning.progress import refresh_progress
+
+def upsert_lesson_students(rows, batch_size=200):
+  # rows of (lesson id, student id, score, answer ids)
+  now = timezone.now()
+  upsert(
+    LessonStudent,
+    ('lesson_id', 'student_id'),
+    ('score', 'answers', 'submitted_at'),
+    [row + (now,) for row in rows],
+    batch_size=batch_size
+  )
+
+def upsert_lesson_student(lesson_id, student_id, score, answer_ids):
+  upsert_lesson_students([(lesson_id, student_id, score, answer_ids)])
+
+def save_answer_students(answer_key, student_id, answer_ids):
+  # legacy storage, one AnswerStudent row per selected answer
+  selected = set(answer_ids)
+
+  # answers of the lesson are known by the key, so no join is needed
+  previous = set(AnswerStudent.objects.filter(
+    student_id=student_id,
+    answer_id__in=list(answer_key.answer_ids)
+  ).values_list('answer_id', flat=True))
+
+  removed = previous - selected
+  if removed:
+    AnswerStudent.objects.filter(student_id=student_id, answer_id__in=removed).delete()
+
+  added = selected - previous
+  if added:
+    AnswerStudent.objects.bulk_create([
+      AnswerStudent(answer_id=answer_id, student_id=student_id) for answer_id in added
+    ], ignore_conflicts=True)
+
+def record_leaderboards(lesson_scores, progress):
+  # once saved, the new scores go to the lesson and course leaderboards,
+  # and the statistics of the lessons are computed again
+  def record():
+    record_scores('lesson', lesson_scores)
+    record_scores('course', [(course_id, student_id, score) for course_id, student_id, passed, score, last in progress])
+    invalidate_lesson_stats([lesson_id for lesson_id, student_id, score in lesson_scores])
+  transaction.on_commit(record)
+
+def save_submission(answer_key, student_id, answer_ids, score):
+  """
+  Persist the answers selected by a student in a lesson and its score
+  in a single LessonStudent row, and the progress of the student in
+  the course, atomically.
+  """
+  with transaction.atomic():
+    if get_setting('SUBMISSION_STORAGE') == 'rows':
+      save_answer_students(answer_key, student_id, answer_ids)
+
+    upsert_lesson_student(answer_key.lesson_id, student_id, score, answer_ids)
+    progress = refresh_progress([answer_key.lesson_id], [student_id])
+    record_leaderboards([(answer_key.lesson_id, student_id, score)], progress)
+
+def selected_answers(lesson_id, student_id):
+  # answers selected by a student in a lesson, from its single row
+  return LessonStudent.objects.filter(lesson=lesson_id, student=student_id) \
+    .values_list('answers', flat=True).first() or ()
+
+def save_submissions(submissions):
+  """
+  Persist many graded submissions, given as tuples of (answer key,
+  student id, answer ids, score), in a single transaction. When a
+  student submits the same lesson more than once, the last one is kept.
+  """
+  rows = {}
+  for answer_key, student_id, answer_ids, score in submissions:
+    rows[(answer_key.lesson_id, student_id)] = (answer_key.lesson_id, student_id, score, answer_ids)
+
+  with transaction.atomic():
+    if get_setting('SUBMISSION_STORAGE') == 'rows':
+      for answer_key, student_id, answer_ids, score in submissions:
+        save_answer_students(answer_key, student_id, answer_ids)
+
+    upsert_lesson_students(list(rows.values()))
+    progress = refresh_progress([lesson_id for lesson_id, student_id in rows], [student_id for lesson_id, student_id in rows])
+    record_leaderboards([(lesson_id, student_id, score) for lesson_id, student_id, score, answer_ids in rows.values()], progress)
@@ -0,0 +1,77 @@
+import gzip
+
+from elearning.bases.compiled import get_compiled_serializer
+from elearning.bases.prefetch import get_prefetch_plan
+from elearning.bases.renderers import FastJSONRenderer
+from elearning.cache import LRUCache
+from elearning.conf import get_setting
+from elearning.constants import USER_TYPE, SYLLABUS_AUDIENCE
+from elearning.models import Lesson, CourseSnapshot
+from elearning.serializers import CourseSerializer, LessonSerializer, LessonSyllabusSerializer
+
+# The syllabus of a course is the course with its lessons, questions and
+# answers, rendered in a single JSON document. Changing any of them bumps
+# the version of the course (see elearning.signals), so a snapshot is
+# rendered once by version and audience, on the first read after the
+# change, and the snapshots of previous versions are dropped then.
+
+LESSON_SERIALIZERS = {
+  # opened lessons, answers without is_correct
+  SYLLABUS_AUDIENCE.STUDENT: LessonSerializer,
+  SYLLABUS_AUDIENCE.STAFF: LessonSyllabusSerializer,
+}
+
+# gzipped syllabus by (course id, version, audience)
+snapshots = LRUCache(get_setting('SYLLABUS_CACHE_SIZE'))
+
+def get_audience(user):
+  return SYLLABUS_AUDIENCE.STUDENT if user.user_type == USER_TYPE.STUDENT else SYLLABUS_AUDIENCE.STAFF
+
+def render_syllabus(course, audience):
+  lessons = Lesson.objects.filter(course=course).order_by('pk')
+  if audience == SYLLABUS_AUDIENCE.STUDENT:
+    lessons = lessons.filter(opened=True)
+
+  serializer_class = LESSON_SERIALIZERS[audience]
+  compiled = get_compiled_serializer(serializer_class)
+  if compiled is not None:
+    lessons_data = compiled.serialize(lessons)
+  else:
+    lessons_data = serializer_class(get_prefetch_plan(serializer_class).apply(lessons), many=True).data
+
+  data = CourseSerializer(course).data
+  data['lessons'] = lessons_data
+  return gzip.compress(FastJSONRenderer().render(data))
+
+def save_snapshot(course, audience, content):
+  CourseSnapshot.objects.filter(course=course, version__lt=course.version).delete()
+  # a concurrent request may have saved it first
+  CourseSnapshot.objects.get_or_create(
+    course=course,
+    version=course.version,
+    audience=audience,
+    defaults={'content': content}
+  )
+
+def get_syllabus(course, audience):
+  """
+  Gzipped syllabus of `course` for `audience` at the version of `course`,
+  from memory, from its snapshot or rendered and saved as its snapshot.
+  """
+  key = (course.pk, course.version, audience)
+  content = snapshots.get(key)
+  if content is not None:
+    return content
+
+  content = CourseSnapshot.objects.filter(course=course, version=course.version, audience=audience) \
+    .values_list('content', flat=True) \
+    .first()
+
+  if content is None:
+    content = render_syllabus(course, audience)
+    save_snapshot(course, audience, content)
+
+  # postgres reads binary fields as memoryview
+  content = bytes(content)
+  snapshots.set(key, content)
+  return content
@@ -0,0 +1,34 @@
+from elearning.bases.tasks import task, set_progress
+from elearning.grading import get_answer_key
+from elearning.models import Course, Lesson
+from elearning.regrading import regrade_lesson, regrade_course
+from elearning.submissions import save_submission
+
+@task
+def grade_submission(lesson_id, student_id, answer_ids):
+  lesson = Lesson.objects.get(pk=lesson_id)
+  answer_key = get_answer_key(lesson)
+
+  score = answer_key.grade(answer_ids)
+  save_submission(answer_key, student_id, answer_ids, score)
+
+  return {
+    'score': score,
+    'approved': lesson.approval_score is None or lesson.approval_score <= score
+  }
+
+@task
+def regrade_lesson_submissions(lesson_id, task_id=None):
+  def progress(graded, changed):
+    set_progress(task_id, {'graded': graded, 'changed': changed})
+
+  graded, changed = regrade_lesson(Lesson.objects.get(pk=lesson_id), progress=progress)
+  return {'graded': graded, 'changed': changed}
+
+@task
+def regrade_course_submissions(course_id, task_id=None):
+  def progress(graded, changed):
+    set_progress(task_id, {'graded': graded, 'changed': changed})
+
+  graded, changed = regrade_course(Course.objects.get(pk=course_id), progress=progress)
+  return {'graded': graded, 'changed': changed}
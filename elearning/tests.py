@@ -1,3 +1,1272 @@
-from django.test import TestCase
+import gzip
+import inspect
+import json
+import msgpack
+import os
+import tempfile
 
-# Create your tests here.
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.serializers import serialize
+from django.db import connection
+from django.db.transaction import TransactionManagementError
+from django.utils import timezone
+from django.utils.http import http_date
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework import viewsets
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from elearning import serializers
+from elearning.bases.compiled import CompiledSerializer, NotCompilable
+from elearning.authentication import AccessToken, RevokedTokens, TokenCache, revoked_tokens, tokens
+from elearning.bases.tasks import SyncTaskBackend, task
+from elearning.bases.renderers import FastJSONRenderer
+from elearning.bases.serializers import SerializerModelBase
+from elearning.bases.search import _indexes
+from elearning.bases.views import CompiledReadMixin
+from elearning.checks import leaderboard_cache_check
+from elearning.constants import USER_TYPE, QUESTION_TYPE, TASK_STATUS
+from elearning.models import User, Course, Lesson, Question, Answer, AnswerStudent, LessonStudent, Task
+from elearning.grading import answer_keys, get_answer_key, load_answer_key
+from elearning.leaderboards import Leaderboard, get_leaderboard, invalidate, leaderboards
+from elearning.prerequisites import unlocked
+from elearning.regrading import regrade_lesson
+from elearning.submissions import save_submission
+from elearning.utils import LazyEncoder, to_json
+from elearning.views import AnswerViewSet
+
+
+# serializers reading values that are not model fields
+NOT_COMPILABLE = (
+    serializers.TaskSerializer,
+    serializers.CourseProgressSerializer,
+)
+
+
+def model_serializers():
+    return [
+        serializer_class for name, serializer_class in inspect.getmembers(serializers, inspect.isclass)
+        if issubclass(serializer_class, SerializerModelBase)
+        and serializer_class.__module__ == serializers.__name__
+        and getattr(getattr(serializer_class, 'Meta', None), 'model', None)
+    ]
+
+
+class ElearningTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'password', user_type=USER_TYPE.TEACHER)
+        cls.students = [
+            User.objects.create_user('student%s' % i, first_name='Student', user_type=USER_TYPE.STUDENT)
+            for i in range(3)
+        ]
+
+        cls.course = Course.objects.create(title='Python', description='Basics', opened=True, teacher=cls.teacher)
+        cls.next_course = Course.objects.create(title='Django', teacher=cls.teacher, previous=cls.course)
+
+        cls.lessons = []
+        previous = None
+        for i in range(3):
+            lesson = Lesson.objects.create(
+                title='Lesson %s' % i,
+                description='Lesson %s description' % i if i else None,
+                opened=bool(i % 2),
+                approval_score=2,
+                teacher=cls.teacher,
+                course=cls.course,
+                previous=previous
+            )
+            cls.lessons.append(lesson)
+            previous = lesson
+
+            for question_type in (QUESTION_TYPE.BOOLEAN, QUESTION_TYPE.ONE,
+                                  QUESTION_TYPE.MORE_THAN_ONE, QUESTION_TYPE.MORE_THAN_ONE_ALL):
+                question = Question.objects.create(
+                    text='Question %s' % question_type,
+                    type=question_type,
+                    score=question_type,
+                    lesson=lesson,
+                    teacher=cls.teacher
+                )
+                for j in range(3):
+                    Answer.objects.create(text='Answer %s' % j, is_correct=j < 2, question=question)
+
+        # a lesson without questions
+        Lesson.objects.create(title='Empty', teacher=cls.teacher, course=cls.next_course)
+
+        for student in cls.students:
+            AnswerStudent.objects.bulk_create([
+                AnswerStudent(answer=answer, student=student)
+                for answer in Answer.objects.filter(question__lesson=cls.lessons[0])[:4]
+            ])
+
+        Task.objects.create(name='task', user=cls.teacher)
+
+
+class GradingTestCase(ElearningTestCase):
+
+    def answers(self, question_type, *texts):
+        return list(Answer.objects.filter(
+            question__lesson=self.lessons[1],
+            question__type=question_type,
+            text__in=['Answer %s' % text for text in texts]
+        ).values_list('pk', flat=True))
+
+    def test_rules(self):
+        answer_key = load_answer_key(self.lessons[1].pk)
+        # answers 0 and 1 are correct, 2 is not; questions score their type
+        cases = [
+            (QUESTION_TYPE.BOOLEAN, (0,), 1),
+            (QUESTION_TYPE.BOOLEAN, (2,), 0),
+            (QUESTION_TYPE.ONE, (1,), 2),
+            (QUESTION_TYPE.ONE, (1, 2), 2),
+            (QUESTION_TYPE.MORE_THAN_ONE, (0,), 0),
+            (QUESTION_TYPE.MORE_THAN_ONE, (0, 1), 3),
+            (QUESTION_TYPE.MORE_THAN_ONE, (0, 1, 2), 3),
+            (QUESTION_TYPE.MORE_THAN_ONE_ALL, (0,), 0),
+            (QUESTION_TYPE.MORE_THAN_ONE_ALL, (0, 1), 4),
+        ]
+        for question_type, texts, score in cases:
+            with self.subTest(type=question_type, answers=texts):
+                self.assertEqual(answer_key.grade(self.answers(question_type, *texts)), score)
+
+        self.assertEqual(answer_key.grade([]), 0)
+        # an answer selected twice counts once
+        self.assertEqual(answer_key.grade(self.answers(QUESTION_TYPE.MORE_THAN_ONE, 0) * 2), 0)
+        # partial answers, questions are graded apart
+        partial = self.answers(QUESTION_TYPE.BOOLEAN, 0) + self.answers(QUESTION_TYPE.MORE_THAN_ONE_ALL, 0)
+        self.assertEqual(answer_key.question_scores(partial), {
+            Question.objects.get(lesson=self.lessons[1], type=QUESTION_TYPE.BOOLEAN).pk: 1,
+            Question.objects.get(lesson=self.lessons[1], type=QUESTION_TYPE.MORE_THAN_ONE_ALL).pk: 0,
+        })
+
+    def test_select_answers(self):
+        client = APIClient()
+        client.force_authenticate(self.students[0])
+        url = '/api/v1/lessons/%s/select_answers/' % self.lessons[1].pk
+
+        response = client.post(url, {'answers': []}, format='json')
+        self.assertEqual(response.json()['data'], {'score': 0})
+
+        response = client.post(url, {'answers': self.answers(QUESTION_TYPE.BOOLEAN, 0, 2)}, format='json')
+        self.assertEqual(response.json()['data'], {'score': 1})
+        self.assertIn('not approved', response.json()['message'])
+
+        response = client.post(url, {'answers': self.answers(QUESTION_TYPE.ONE, 0, 2)}, format='json')
+        self.assertEqual(response.json()['data'], {'score': 2})
+        self.assertIn('Lesson approved', response.json()['message'])
+
+        # answers of another lesson are not part of its key
+        other = Answer.objects.filter(question__lesson=self.lessons[0]).first()
+        response = client.post(url, {'answers': self.answers(QUESTION_TYPE.ONE, 0) + [other.pk]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class AnswerKeyTestCase(ElearningTestCase):
+
+    def setUp(self):
+        answer_keys.clear()
+
+    def correct(self, lesson):
+        return sorted(pk for pk, (question_id, is_correct) in get_answer_key(lesson).answers.items() if is_correct)
+
+    def test_cached_by_version(self):
+        lesson = Lesson.objects.get(pk=self.lessons[1].pk)
+        answer_key = get_answer_key(lesson)
+        with self.assertNumQueries(0):
+            self.assertIs(get_answer_key(lesson), answer_key)
+
+        # editing an answer moves the lesson to a new version, with a new key
+        answer = Answer.objects.filter(question__lesson=lesson, is_correct=False).first()
+        answer.is_correct = True
+        answer.save()
+
+        lesson.refresh_from_db()
+        self.assertEqual(lesson.version, answer_key.version + 1)
+        self.assertIn(answer.pk, self.correct(lesson))
+
+        answer.delete()
+        lesson.refresh_from_db()
+        self.assertNotIn(answer.pk, get_answer_key(lesson))
+
+    def test_moved_question(self):
+        source, target = Lesson.objects.filter(pk__in=[self.lessons[0].pk, self.lessons[1].pk]).order_by('pk')
+        get_answer_key(source), get_answer_key(target)
+
+        question = Question.objects.filter(lesson=source).first()
+        question.lesson = target
+        question.save()
+
+        # both lessons change
+        for lesson in (source, target):
+            lesson.refresh_from_db()
+        answers = set(Answer.objects.filter(question=question).values_list('pk', flat=True))
+        self.assertFalse(answers & set(get_answer_key(source).answer_ids))
+        self.assertTrue(answers <= set(get_answer_key(target).answer_ids))
+
+    @override_settings(ELEARNING={'ANSWER_KEY_SHARED_CACHE': 'default'})
+    def test_shared_cache(self):
+        lesson = self.lessons[1]
+        answer_key = get_answer_key(lesson)
+
+        # another process, without the key in memory
+        answer_keys.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_answer_key(lesson).answers, answer_key.answers)
+
+
+class SubmissionTestCase(ElearningTestCase):
+
+    def submit(self, answer_ids):
+        answer_key = load_answer_key(self.lessons[0].pk)
+        save_submission(answer_key, self.students[0].pk, answer_ids, answer_key.grade(answer_ids))
+
+    def rows(self):
+        return dict(AnswerStudent.objects.filter(student=self.students[0]).values_list('answer_id', 'pk'))
+
+    def resubmit(self):
+        answers = list(Answer.objects.filter(question__lesson=self.lessons[0]).order_by('pk').values_list('pk', flat=True))
+
+        self.submit(answers[:3])
+        rows = self.rows()
+        lesson_student = LessonStudent.objects.get(lesson=self.lessons[0], student=self.students[0])
+        self.assertEqual(set(lesson_student.answers), set(answers[:3]))
+
+        self.submit(answers[1:5])
+        updated = LessonStudent.objects.get(lesson=self.lessons[0], student=self.students[0])
+        self.assertEqual(updated.pk, lesson_student.pk)
+        self.assertEqual(set(updated.answers), set(answers[1:5]))
+        self.assertEqual(updated.score, load_answer_key(self.lessons[0].pk).grade(answers[1:5]))
+        return answers, rows
+
+    @override_settings(ELEARNING={'SUBMISSION_STORAGE': 'rows'})
+    def test_rows_delta(self):
+        answers, rows = self.resubmit()
+
+        # rows kept are not written again, only the delta is
+        after = self.rows()
+        self.assertEqual(set(after), set(answers[1:5]))
+        for answer_id in answers[1:3]:
+            self.assertEqual(after[answer_id], rows[answer_id])
+
+        # rows of other lessons are left alone
+        other = AnswerStudent.objects.create(answer=Answer.objects.filter(question__lesson=self.lessons[1]).first(), student=self.students[0])
+        self.submit([])
+        self.assertEqual(list(self.rows().values()), [other.pk])
+
+    def test_compact(self):
+        self.resubmit()
+        self.assertEqual(LessonStudent.objects.filter(student=self.students[0]).count(), 1)
+
+    def test_without_upsert(self):
+        with mock.patch('elearning.bases.upsert.supports_upsert', return_value=False):
+            self.resubmit()
+
+
+@override_settings(ELEARNING={'COMPILED_SERIALIZERS': False})
+class PrefetchTestCase(ElearningTestCase):
+
+    def queries(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_constant_queries(self):
+        for user in (self.admin, self.teacher, self.students[0]):
+            client = APIClient()
+            client.force_authenticate(user)
+            for url in ('/api/v1/lessons/', '/api/v1/courses/%s/lessons/' % self.course.pk, '/api/v1/courses/'):
+                with self.subTest(user=user.username, url=url):
+                    expected = self.queries(client, url)
+
+                    # more of every nested object, the same queries
+                    course = Course.objects.create(title='More', opened=True, teacher=self.teacher)
+                    for i in range(3):
+                        lesson = Lesson.objects.create(title='More %s' % i, opened=True, teacher=self.teacher, course=course)
+                        question = Question.objects.create(text='More', type=QUESTION_TYPE.ONE, score=1, lesson=lesson, teacher=self.teacher)
+                        Answer.objects.bulk_create([Answer(text='More', is_correct=j < 1, question=question) for j in range(2)])
+
+                    with self.assertNumQueries(expected):
+                        client.get(url)
+
+
+class CompiledSerializerTestCase(ElearningTestCase):
+
+    def test_parity(self):
+        renderer = JSONRenderer()
+
+        for serializer_class in model_serializers():
+            with self.subTest(serializer=serializer_class.__name__):
+                if serializer_class in NOT_COMPILABLE:
+                    with self.assertRaises(NotCompilable):
+                        CompiledSerializer(serializer_class())
+                    continue
+
+                queryset = serializer_class.Meta.model.objects.order_by('pk')
+                expected = serializer_class(queryset, many=True).data
+                compiled = CompiledSerializer(serializer_class()).serialize(queryset)
+
+                self.assertEqual(renderer.render(compiled), renderer.render(expected))
+
+    def test_views_parity(self):
+        urls = [
+            '/api/v1/courses/',
+            '/api/v1/courses/%s/' % self.course.pk,
+            '/api/v1/lessons/',
+            '/api/v1/lessons/%s/' % self.lessons[0].pk,
+            '/api/v1/courses/%s/lessons/' % self.course.pk,
+            '/api/v1/questions/',
+            '/api/v1/answers/',
+            '/api/v1/answers/%s/' % Answer.objects.first().pk,
+        ]
+
+        for user in (self.admin, self.teacher, self.students[0]):
+            client = APIClient()
+            client.force_authenticate(user)
+
+            for url in urls:
+                with self.subTest(user=user.username, url=url):
+                    compiled = client.get(url)
+                    with override_settings(ELEARNING={'COMPILED_SERIALIZERS': False}):
+                        expected = client.get(url)
+
+                    self.assertEqual(compiled.status_code, expected.status_code)
+                    self.assertEqual(compiled.content, expected.content)
+
+    def test_invalid_lookup(self):
+        class CompiledCourseViewSet(CompiledReadMixin, viewsets.ReadOnlyModelViewSet):
+            queryset = Course.objects.all()
+            serializer_class = serializers.CourseSerializer
+
+        view = CompiledCourseViewSet.as_view({'get': 'retrieve'})
+        for pk, status_code in ((self.course.pk, 200), (0, 404), ('abc', 404)):
+            with self.subTest(pk=pk):
+                request = APIRequestFactory().get('/')
+                force_authenticate(request, self.teacher)
+                self.assertEqual(view(request, pk=pk).status_code, status_code)
+
+
+class FastJSONTestCase(ElearningTestCase):
+
+    def test_to_json_parity(self):
+        for model in (User, Course, Lesson, Question, Answer, AnswerStudent, Task):
+            for obj in model.objects.order_by('pk'):
+                with self.subTest(model=model.__name__, pk=obj.pk):
+                    expected = json.loads(serialize('json', [obj], cls=LazyEncoder))[0]
+                    self.assertEqual(to_json(obj), expected)
+
+    def test_renderer_parity(self):
+        data = [
+            {'datetime': datetime(2019, 10, 1, 12, 30, 15, 123456), 'date': date(2019, 10, 1), 'time': time(12, 30)},
+            {'decimal': Decimal('1.10'), 'floats': [0.1, 1e16, 1e-05, -2.5e-300], 'big': 2 ** 70},
+            {'text': 'caf\u00e9 \u2028 \u2029 "1,1e5" </script>', 'keys': {2: 'two', None: 'none', True: 'true', 1.5: 'float'}},
+            [], {}, 'text', 1, None,
+        ]
+        renderer, expected_renderer = FastJSONRenderer(), JSONRenderer()
+
+        for value in data:
+            with self.subTest(value=value):
+                self.assertEqual(renderer.render(value), expected_renderer.render(value))
+
+        for media_type in ('application/json', 'application/json; indent=4'):
+            with self.subTest(media_type=media_type):
+                self.assertEqual(renderer.render(data, media_type), expected_renderer.render(data, media_type))
+
+
+class MessagePackTestCase(ElearningTestCase):
+
+    def test_views_parity(self):
+        client = APIClient()
+        client.force_authenticate(self.students[0])
+
+        for url in ('/api/v1/lessons/', '/api/v1/lessons/%s/' % self.lessons[1].pk, '/api/v1/courses/'):
+            with self.subTest(url=url):
+                response = client.get(url, HTTP_ACCEPT='application/msgpack')
+                self.assertEqual(response['Content-Type'], 'application/msgpack')
+                self.assertEqual(msgpack.unpackb(response.content, raw=False), json.loads(client.get(url).content))
+
+    def test_select_answers(self):
+        client = APIClient()
+        client.force_authenticate(self.students[1])
+        lesson = self.lessons[1]
+        answers = list(Answer.objects.filter(question__lesson=lesson).values_list('pk', flat=True)[:2])
+
+        response = client.post(
+            '/api/v1/lessons/%s/select_answers/' % lesson.pk,
+            msgpack.packb({'answers': answers}),
+            content_type='application/msgpack',
+            HTTP_ACCEPT='application/msgpack'
+        )
+        expected = client.post('/api/v1/lessons/%s/select_answers/' % lesson.pk, {'answers': answers}, format='json')
+
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(msgpack.unpackb(response.content, raw=False), json.loads(expected.content))
+
+
+class SparseFieldsTestCase(ElearningTestCase):
+
+    def test_fieldsets(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        url = '/api/v1/lessons/%s/' % self.lessons[0].pk
+
+        lesson = client.get(url, {'fields': 'id,title', 'expand': ''}).json()
+        self.assertEqual(list(lesson), ['id', 'title'])
+
+        lesson = client.get(url, {'fields': 'title,questions.text'}).json()
+        self.assertEqual(list(lesson), ['title', 'questions'])
+        self.assertEqual([list(question) for question in lesson['questions']], [['text']] * 4)
+
+        lesson = client.get(url, {'expand': 'questions'}).json()
+        self.assertNotIn('answers', lesson['questions'][0])
+
+        for params in ({'fields': 'unknown'}, {'fields': 'title.text'}, {'expand': 'title'}):
+            with self.subTest(params=params):
+                self.assertEqual(client.get(url, params).status_code, 400)
+
+    def test_views_parity(self):
+        urls = [
+            '/api/v1/lessons/?fields=id,title&expand=',
+            '/api/v1/lessons/?fields=title,questions.text,questions.answers.text',
+            '/api/v1/lessons/%s/?expand=questions' % self.lessons[0].pk,
+            '/api/v1/courses/?fields=title,teacher',
+            '/api/v1/answers/?fields=text,question',
+        ]
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+
+        for url in urls:
+            with self.subTest(url=url):
+                compiled = client.get(url)
+                with override_settings(ELEARNING={'COMPILED_SERIALIZERS': False}):
+                    expected = client.get(url)
+
+                self.assertEqual(compiled.status_code, 200)
+                self.assertEqual(compiled.content, expected.content)
+
+
+class SyllabusTestCase(ElearningTestCase):
+
+    def get_syllabus(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/v1/courses/%s/syllabus/' % self.course.pk, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        return json.loads(gzip.decompress(response.content))
+
+    def test_audiences(self):
+        syllabus = self.get_syllabus(self.students[0])
+        self.assertEqual([lesson['id'] for lesson in syllabus['lessons']], [self.lessons[1].pk])
+        answer = syllabus['lessons'][0]['questions'][0]['answers'][0]
+        self.assertNotIn('is_correct', answer)
+
+        syllabus = self.get_syllabus(self.teacher)
+        self.assertEqual([lesson['id'] for lesson in syllabus['lessons']], [lesson.pk for lesson in self.lessons])
+        self.assertIn('is_correct', syllabus['lessons'][0]['questions'][0]['answers'][0])
+
+    def test_content_changes(self):
+        self.get_syllabus(self.teacher)
+
+        answer = Answer.objects.filter(question__lesson=self.lessons[0]).first()
+        answer.text = 'Changed'
+        answer.save()
+
+        syllabus = self.get_syllabus(self.teacher)
+        answers = [
+            answer['text']
+            for question in syllabus['lessons'][0]['questions']
+            for answer in question['answers']
+        ]
+        self.assertIn('Changed', answers)
+
+    def test_encodings(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        url = '/api/v1/courses/%s/syllabus/' % self.course.pk
+
+        gzipped = client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        identity = client.get(url)
+        self.assertNotIn('Content-Encoding', identity)
+        self.assertEqual(json.loads(identity.content), json.loads(gzip.decompress(gzipped.content)))
+
+        for response in (gzipped, identity):
+            self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertNotEqual(gzipped['ETag'], identity['ETag'])
+
+        # a tag only revalidates the encoding it was sent with
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=identity['ETag']).status_code, 304)
+        response = client.get(url, HTTP_IF_NONE_MATCH=gzipped['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+
+
+class PrerequisitesTestCase(ElearningTestCase):
+
+    def unlocked(self, student):
+        rows = list(unlocked(student))
+        courses = {pk: course for type, pk, title, course in rows if type == 'course'}
+        lessons = {pk: course for type, pk, title, course in rows if type == 'lesson'}
+        return courses, lessons
+
+    def test_unlocked(self):
+        student = self.students[0]
+        # lesson ids apart from course ids
+        empty = Lesson.objects.get(title='Empty')
+        self.assertNotEqual(empty.pk, self.next_course.pk)
+
+        courses, lessons = self.unlocked(student)
+        self.assertEqual(courses, {self.course.pk: self.course.pk})
+        self.assertEqual(lessons, {self.lessons[0].pk: self.course.pk})
+
+        LessonStudent.objects.create(lesson=self.lessons[0], student=student, score=1)
+        courses, lessons = self.unlocked(student)
+        self.assertEqual(lessons, {self.lessons[0].pk: self.course.pk})
+
+        LessonStudent.objects.filter(lesson=self.lessons[0], student=student).update(score=2)
+        courses, lessons = self.unlocked(student)
+        self.assertEqual(lessons, {self.lessons[0].pk: self.course.pk, self.lessons[1].pk: self.course.pk})
+
+        for lesson in self.lessons[1:]:
+            LessonStudent.objects.create(lesson=lesson, student=student, score=2)
+        courses, lessons = self.unlocked(student)
+        self.assertEqual(courses, {self.course.pk: self.course.pk, self.next_course.pk: self.next_course.pk})
+        self.assertEqual(lessons[empty.pk], self.next_course.pk)
+        self.assertEqual(len(lessons), 4)
+
+        # other students keep their own prerequisites
+        self.assertEqual(self.unlocked(self.students[1])[1], {self.lessons[0].pk: self.course.pk})
+
+    def test_me_unlocked(self):
+        client = APIClient()
+        client.force_authenticate(self.students[0])
+
+        data = client.get('/api/v1/me/unlocked/').json()
+        # only opened courses and lessons, lesson 0 is closed
+        self.assertEqual(data, {'courses': [{'id': self.course.pk, 'title': 'Python'}], 'lessons': []})
+
+
+class UserSearchTestCase(ElearningTestCase):
+
+    def search(self, query):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/v1/users/', {'search': query})
+        return sorted(user['username'] for user in response.json()['results'])
+
+    def test_word_prefixes(self):
+        students = ['student0', 'student1', 'student2']
+        self.assertEqual(self.search('STUD'), students)
+        self.assertEqual(self.search('student1'), ['student1'])
+        # every word matches, in any field
+        self.assertEqual(self.search('stud studen'), students)
+        self.assertEqual(self.search('teach example'), ['teacher'])
+        # not inside words
+        self.assertEqual(self.search('udent'), [])
+        self.assertEqual(self.search('stud example'), [])
+
+
+class CatalogSearchTestCase(ElearningTestCase):
+
+    def setUp(self):
+        # indexes outlive the rolled back objects of other tests
+        for index in _indexes.values():
+            index.loaded = None
+
+    def search(self, user, query):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/v1/search/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_ranking(self):
+        flask = Course.objects.create(title='Flask', description='Web apps in Python', opened=True, teacher=self.teacher)
+
+        # whole words before prefixes, titles before descriptions
+        hits = self.search(self.teacher, 'python')
+        self.assertEqual([(hit['type'], hit['id']) for hit in hits], [('course', self.course.pk), ('course', flask.pk)])
+        self.assertGreater(hits[0]['score'], hits[1]['score'])
+
+        hits = self.search(self.teacher, 'pyth')
+        self.assertEqual([hit['id'] for hit in hits], [self.course.pk, flask.pk])
+        self.assertEqual(self.search(self.teacher, 'yth'), [])
+
+    def test_visibility(self):
+        hits = self.search(self.teacher, 'lesson')
+        self.assertEqual(sorted(hit['id'] for hit in hits), [lesson.pk for lesson in self.lessons])
+        self.assertEqual({hit['course'] for hit in hits}, {self.course.pk})
+
+        # students only find opened lessons and courses
+        hits = self.search(self.students[0], 'lesson')
+        self.assertEqual([hit['id'] for hit in hits], [self.lessons[1].pk])
+        self.assertEqual(len(self.search(self.teacher, 'django')), 1)
+        self.assertEqual(self.search(self.students[0], 'django'), [])
+
+    def test_highlight(self):
+        Course.objects.create(title='<Python> & co', opened=True, teacher=self.teacher)
+
+        hits = self.search(self.teacher, 'descr 1')
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(hits[0]['title'], 'Lesson <b>1</b>')
+        self.assertEqual(hits[0]['snippet'], 'Lesson <b>1</b> <b>description</b>')
+
+        titles = [hit['title'] for hit in self.search(self.teacher, 'python')]
+        self.assertIn('&lt;<b>Python</b>&gt; &amp; co', titles)
+
+    @override_settings(ELEARNING={'SEARCH_RESULTS_LIMIT': 2})
+    def test_limit(self):
+        self.assertEqual(len(self.search(self.teacher, 'lesson')), 2)
+
+
+class ContentVersionTestCase(ElearningTestCase):
+
+    def test_stale_instance_does_not_reuse_versions(self):
+        lesson = Lesson.objects.get(pk=self.lessons[0].pk)
+        version = lesson.version
+
+        # an answer edited meanwhile bumps the version in the database
+        answer = Answer.objects.filter(question__lesson=lesson).first()
+        answer.text = 'Changed'
+        answer.save()
+        self.assertEqual(Lesson.objects.get(pk=lesson.pk).version, version + 1)
+
+        lesson.title = 'Renamed'
+        lesson.save()
+        self.assertEqual(lesson.version, version + 2)
+        self.assertEqual(Lesson.objects.get(pk=lesson.pk).version, version + 2)
+
+    def test_conditional_get(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        lesson = self.lessons[0]
+        url = '/api/v1/lessons/%s/' % lesson.pk
+
+        # last changed long ago, so a change now moves Last-Modified
+        Lesson.objects.filter(pk=lesson.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        answer = Answer.objects.filter(question__lesson=lesson).first()
+        answer.is_correct = not answer.is_correct
+        answer.save()
+
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    def test_conditional_list(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        url = '/api/v1/courses/'
+
+        etag = client.get(url)['ETag']
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Course.objects.create(title='Flask', teacher=self.teacher)
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_conditional_list_delete(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        url = '/api/v1/answers/'
+
+        response = client.get(url)
+        # deleting an answer does not move the last updated_at of the others
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+
+        Answer.objects.order_by('pk').last().delete()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag, HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_lookup(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        for url in ('/api/v1/courses/abc/', '/api/v1/lessons/abc/', '/api/v1/questions/abc/', '/api/v1/answers/abc/'):
+            with self.subTest(url=url):
+                self.assertEqual(client.get(url).status_code, 404)
+
+
+@task(name='elearning.tests.add')
+def add(a, b, task_id=None):
+    return {'sum': a + b, 'task_id': str(task_id)}
+
+
+@task(name='elearning.tests.fail')
+def fail():
+    raise ValueError('broken')
+
+
+class TaskTestCase(ElearningTestCase):
+
+    def test_status_transitions(self):
+        backend = SyncTaskBackend()
+        task_id = backend.enqueue(add, (1, 2), {}, user=self.teacher)
+        self.assertEqual(Task.objects.get(pk=task_id).status, TASK_STATUS.PENDING)
+
+        backend.run(task_id)
+        done = Task.objects.get(pk=task_id)
+        self.assertEqual(done.status, TASK_STATUS.SUCCESS)
+        self.assertEqual(json.loads(done.result), {'sum': 3, 'task_id': str(task_id)})
+        self.assertIsNotNone(done.started)
+        self.assertIsNotNone(done.finished)
+
+        # claimed tasks do not run again
+        Task.objects.filter(pk=task_id).update(result=None)
+        backend.run(task_id)
+        self.assertIsNone(Task.objects.get(pk=task_id).result)
+
+        task_id = backend.enqueue(fail, (), {})
+        with self.assertLogs('elearning.bases.tasks', 'ERROR'):
+            backend.run(task_id)
+        failed = Task.objects.get(pk=task_id)
+        self.assertEqual(failed.status, TASK_STATUS.FAILURE)
+        self.assertEqual(failed.error, 'ValueError: broken')
+
+    def test_deferred_grading(self):
+        client = APIClient()
+        client.force_authenticate(self.students[0])
+        lesson = self.lessons[1]
+        url = '/api/v1/lessons/%s/select_answers/' % lesson.pk
+        answers = list(Answer.objects.filter(question__lesson=lesson, is_correct=True).values_list('pk', flat=True))
+
+        response = client.post(url + '?deferred=maybe', {'answers': answers}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = client.post(url + '?deferred=true', {'answers': answers}, format='json')
+        self.assertEqual(response.status_code, 202)
+        task_id = response.json()['data']['task_id']
+
+        # queued until the transaction commits, run it here
+        SyncTaskBackend().run(task_id)
+
+        response = client.get('/api/v1/tasks/%s/' % task_id)
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertEqual(response.json()['result'], {'score': 10, 'approved': True})
+
+        # tasks of other users are not found
+        other = APIClient()
+        other.force_authenticate(self.students[1])
+        self.assertEqual(other.get('/api/v1/tasks/%s/' % task_id).status_code, 404)
+
+
+class SubmittingTestCase(ElearningTestCase):
+
+    def setUp(self):
+        # leaderboard versions live in the default cache
+        cache.clear()
+        leaderboards.clear()
+
+        # test cases never commit, run the callbacks of saved submissions now
+        patcher = mock.patch('elearning.submissions.transaction.on_commit', side_effect=lambda callback: callback())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def submit(self, student, lesson, *question_types):
+        # the correct answers of the questions of `question_types`, of all without them
+        client = APIClient()
+        client.force_authenticate(student)
+        answers = Answer.objects.filter(question__lesson=lesson, is_correct=True)
+        if question_types:
+            answers = answers.filter(question__type__in=question_types)
+        response = client.post(
+            '/api/v1/lessons/%s/select_answers/' % lesson.pk,
+            {'answers': list(answers.values_list('pk', flat=True))},
+            format='json'
+        )
+        return response.json()['data']['score']
+
+
+class ProgressTestCase(SubmittingTestCase):
+
+    def progress(self, student):
+        client = APIClient()
+        client.force_authenticate(student)
+        return [
+            (row['course_title'], row['lessons_passed'], row['score'])
+            for row in client.get('/api/v1/me/progress/').json()
+        ]
+
+    def test_submissions(self):
+        student = self.students[0]
+        self.assertEqual(self.progress(student), [])
+
+        self.assertEqual(self.submit(student, self.lessons[1]), 10)
+        self.assertEqual(self.progress(student), [('Python', 1, 10)])
+
+        # a lower score not approving the lesson anymore
+        self.assertEqual(self.submit(student, self.lessons[1], QUESTION_TYPE.BOOLEAN), 1)
+        self.assertEqual(self.progress(student), [('Python', 0, 1)])
+        self.assertEqual(self.progress(self.students[1]), [])
+
+    def test_lesson_changes(self):
+        student = self.students[0]
+        self.submit(student, self.lessons[1], QUESTION_TYPE.BOOLEAN)
+
+        lesson = Lesson.objects.get(pk=self.lessons[1].pk)
+        lesson.approval_score = 1
+        lesson.save()
+        self.assertEqual(self.progress(student), [('Python', 1, 1)])
+
+        lesson.course = self.next_course
+        lesson.save()
+        self.assertEqual(self.progress(student), [('Django', 1, 1)])
+
+        lesson.delete()
+        self.assertEqual(self.progress(student), [])
+
+
+class LessonStatsTestCase(SubmittingTestCase):
+
+    def stats(self, lesson):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        return client.get('/api/v1/lessons/%s/stats/' % lesson.pk).json()
+
+    def test_stats(self):
+        lesson = self.lessons[1]
+        self.submit(self.students[0], lesson)
+        self.submit(self.students[1], lesson, QUESTION_TYPE.BOOLEAN)
+        self.submit(self.students[2], lesson, QUESTION_TYPE.ONE, QUESTION_TYPE.MORE_THAN_ONE)
+
+        stats = self.stats(lesson)
+        self.assertEqual(stats['attempts'], 3)
+        self.assertEqual(stats['mean'], 5.3333)
+        self.assertEqual(stats['median'], 5.0)
+        self.assertEqual((stats['min'], stats['max']), (1.0, 10.0))
+        # approval score of 2
+        self.assertEqual(stats['pass_rate'], 0.6667)
+        self.assertEqual(stats['histogram'], [
+            {'score': 1, 'count': 1},
+            {'score': 5, 'count': 1},
+            {'score': 10, 'count': 1},
+        ])
+
+        types = dict(Question.objects.filter(lesson=lesson).values_list('pk', 'type'))
+        difficulty = {types[question['id']]: question['difficulty'] for question in stats['questions']}
+        self.assertEqual(difficulty, {
+            QUESTION_TYPE.BOOLEAN: 0.6667,
+            QUESTION_TYPE.ONE: 0.6667,
+            QUESTION_TYPE.MORE_THAN_ONE: 0.6667,
+            QUESTION_TYPE.MORE_THAN_ONE_ALL: 0.3333,
+        })
+        boolean = next(question for question in stats['questions'] if types[question['id']] == QUESTION_TYPE.BOOLEAN)
+        self.assertEqual([answer['selected'] for answer in boolean['answers']], [2, 2, 0])
+
+    def test_without_submissions(self):
+        stats = self.stats(self.lessons[0])
+        self.assertEqual(stats['attempts'], 0)
+        self.assertEqual((stats['mean'], stats['median'], stats['pass_rate']), (None, None, None))
+        self.assertEqual(stats['histogram'], [])
+        self.assertEqual(len(stats['questions']), 4)
+        for question in stats['questions']:
+            self.assertEqual((question['answered'], question['difficulty'], question['discrimination']), (None, None, None))
+            self.assertEqual([answer['selected'] for answer in question['answers']], [0, 0, 0])
+
+        self.assertEqual(self.stats(Lesson.objects.get(title='Empty'))['questions'], [])
+
+    def test_invalidation(self):
+        lesson = self.lessons[1]
+        self.submit(self.students[0], lesson)
+        self.assertEqual(self.stats(lesson)['attempts'], 1)
+
+        # new submissions and regrades are seen before the cache expires
+        self.submit(self.students[1], lesson, QUESTION_TYPE.BOOLEAN)
+        self.assertEqual(self.stats(lesson)['histogram'], [{'score': 1, 'count': 1}, {'score': 10, 'count': 1}])
+
+        # a score out of date, cached once the stats expire
+        LessonStudent.objects.filter(lesson=lesson, student=self.students[1]).update(score=0)
+        self.assertEqual(self.stats(lesson)['min'], 1.0)
+        cache.clear()
+        self.assertEqual(self.stats(lesson)['min'], 0.0)
+
+        self.assertEqual(regrade_lesson(Lesson.objects.get(pk=lesson.pk)), (2, 1))
+        self.assertEqual(self.stats(lesson)['min'], 1.0)
+
+
+class GradebookTestCase(ElearningTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # student2 has no submissions, student1 none in the first lesson
+        LessonStudent.objects.bulk_create([
+            LessonStudent(lesson=cls.lessons[0], student=cls.students[0], score=3),
+            LessonStudent(lesson=cls.lessons[1], student=cls.students[0], score=10),
+            LessonStudent(lesson=cls.lessons[1], student=cls.students[1], score=None),
+            LessonStudent(lesson=cls.lessons[2], student=cls.students[1], score=2),
+        ])
+
+    def get(self, **params):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        return client.get('/api/v1/courses/%s/gradebook/' % self.course.pk, params)
+
+    def test_csv(self):
+        response = self.get()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="course-%s-gradebook.csv"' % self.course.pk)
+        self.assertEqual(b''.join(response.streaming_content).decode('utf-8').splitlines(), [
+            'student,username,Lesson 0,Lesson 1,Lesson 2,total',
+            '%s,student0,3,10,,13' % self.students[0].pk,
+            '%s,student1,,,2,2' % self.students[1].pk,
+        ])
+
+    def test_jsonl(self):
+        response = self.get(export='jsonl')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="course-%s-gradebook.jsonl"' % self.course.pk)
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(lines[1], {
+            'student': self.students[1].pk,
+            'username': 'student1',
+            'scores': {str(self.lessons[0].pk): None, str(self.lessons[1].pk): None, str(self.lessons[2].pk): 2},
+            'total': 2,
+        })
+
+    def test_invalid_format(self):
+        self.assertEqual(self.get(export='xlsx').status_code, 400)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'gradebook.csv')
+            call_command('export_gradebook', course=self.course.pk, output=path, chunk_size=1)
+            with open(path, newline='') as output:
+                self.assertEqual(output.read(), b''.join(self.get().streaming_content).decode('utf-8'))
+
+        with self.assertRaises(CommandError):
+            call_command('export_gradebook', course=0)
+
+
+class LeaderboardTestCase(SubmittingTestCase):
+
+    def leaderboard(self, student, **params):
+        client = APIClient()
+        client.force_authenticate(student)
+        return client.get('/api/v1/courses/%s/leaderboard/' % self.course.pk, params).json()
+
+    def test_parameters(self):
+        client = APIClient()
+        client.force_authenticate(self.students[0])
+        url = '/api/v1/courses/%s/leaderboard/' % self.course.pk
+        for params, status_code in (({'lesson': 'abc'}, 400), ({'limit': 'abc'}, 400), ({'lesson': -1}, 404),
+                                    ({'lesson': self.lessons[0].pk}, 200)):
+            with self.subTest(params=params):
+                self.assertEqual(client.get(url, params).status_code, status_code)
+
+    def test_ranks(self):
+        leaderboard = Leaderboard([(1, 5), (2, 7), (3, 5), (4, 1)])
+        self.assertEqual(leaderboard.top(3), [(1, 2, 7), (2, 1, 5), (2, 3, 5)])
+        self.assertEqual(leaderboard.rank(4), 4)
+        self.assertEqual(leaderboard.around(3, 1), [(2, 1, 5), (2, 3, 5), (4, 4, 1)])
+
+        leaderboard.update(4, 9)
+        leaderboard.remove(2)
+        self.assertEqual(leaderboard.top(10), [(1, 4, 9), (2, 1, 5), (2, 3, 5)])
+        self.assertIsNone(leaderboard.rank(2))
+
+    def test_submissions(self):
+        self.assertEqual(self.leaderboard(self.students[0])['count'], 0)
+
+        self.submit(self.students[0], self.lessons[1], QUESTION_TYPE.BOOLEAN)
+        self.submit(self.students[1], self.lessons[1])
+
+        # the loaded leaderboard was updated in place
+        with self.assertNumQueries(3):
+            response = self.leaderboard(self.students[0], around=1)
+        self.assertEqual(
+            [(entry['rank'], entry['username'], entry['score']) for entry in response['top']],
+            [(1, 'student1', 10), (2, 'student0', 1)]
+        )
+        self.assertEqual(response['me'], {'rank': 2, 'score': 1})
+
+        response = self.leaderboard(self.students[0], lesson=self.lessons[1].pk)
+        self.assertEqual(response['me'], {'rank': 2, 'score': 1})
+
+        # another process changed it, it is loaded again
+        leaderboard = get_leaderboard('course', self.course.pk)
+        invalidate('course', self.course.pk)
+        self.assertIsNot(get_leaderboard('course', self.course.pk), leaderboard)
+
+    def test_expiration(self):
+        self.submit(self.students[0], self.lessons[1])
+        leaderboard = get_leaderboard('course', self.course.pk)
+        self.submit(self.students[1], self.lessons[1])
+        self.assertIs(get_leaderboard('course', self.course.pk), leaderboard)
+
+        # updated in place or not, it is loaded again once expired
+        with mock.patch('elearning.cache.time.monotonic', return_value=float('inf')):
+            self.assertIsNot(get_leaderboard('course', self.course.pk), leaderboard)
+
+    def test_cache_check(self):
+        local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+        with override_settings(CACHES=local):
+            self.assertEqual([warning.id for warning in leaderboard_cache_check(None)], ['elearning.W002'])
+        with override_settings(CACHES=shared):
+            self.assertEqual(leaderboard_cache_check(None), [])
+
+
+class BatchSubmissionTestCase(ElearningTestCase):
+
+    url = '/api/v1/lessons/select_answers_batch/'
+
+    def test_validation(self):
+        lesson = self.lessons[1]
+        correct = list(Answer.objects.filter(question__lesson=lesson, is_correct=True).values_list('pk', flat=True))
+        other = Answer.objects.filter(question__lesson=self.lessons[0]).first().pk
+
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        response = client.post(self.url, {'submissions': [
+            {'student': self.students[0].pk, 'lesson': lesson.pk, 'answers': correct},
+            {'student': self.teacher.pk, 'lesson': lesson.pk, 'answers': correct},
+            {'student': self.students[1].pk, 'lesson': 0, 'answers': correct},
+            {'student': self.students[1].pk, 'lesson': 'x', 'answers': [other]},
+            {'student': self.students[1].pk, 'lesson': lesson.pk, 'answers': correct + [other]},
+            {'student': self.students[0].pk, 'lesson': lesson.pk, 'answers': correct[:1]},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        results = response.json()['data']
+        self.assertEqual([result['index'] for result in results], list(range(6)))
+        self.assertEqual(results[0]['score'], 10)
+        self.assertEqual(results[5]['score'], 1)
+        fields = [
+            [error['field'] for error in result['errors']['errors']] if 'errors' in result else None
+            for result in results
+        ]
+        # an unknown lesson is reported apart from its answers
+        self.assertEqual(fields, [None, ['student'], ['lesson'], ['lesson'], ['answers'], None])
+
+        # valid submissions are saved, the last one of a student kept
+        self.assertEqual(
+            list(LessonStudent.objects.filter(lesson=lesson).values_list('student_id', 'score')),
+            [(self.students[0].pk, 1)]
+        )
+
+    def test_limits(self):
+        client = APIClient()
+        client.force_authenticate(self.students[0])
+        self.assertEqual(client.post(self.url, {'submissions': []}, format='json').status_code, 403)
+
+        client.force_authenticate(self.teacher)
+        self.assertEqual(client.post(self.url, {'submissions': []}, format='json').status_code, 400)
+
+        # items that are not objects are reported with the others
+        response = client.post(self.url, {'submissions': [1, {'student': self.students[0].pk, 'lesson': self.lessons[1].pk, 'answers': []}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['index'] for result in response.json()['data']], [0, 1])
+        self.assertIn('errors', response.json()['data'][0])
+        self.assertEqual(response.json()['data'][1]['score'], 0)
+
+
+class RegradeTestCase(ElearningTestCase):
+
+    def submit(self, student, answers):
+        client = APIClient()
+        client.force_authenticate(student)
+        response = client.post('/api/v1/lessons/%s/select_answers/' % self.lessons[1].pk, {'answers': answers}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def scores(self):
+        return dict(LessonStudent.objects.filter(lesson=self.lessons[1]).values_list('student_id', 'score'))
+
+    def test_score_changes(self):
+        lesson = self.lessons[1]
+        correct = Answer.objects.filter(question__lesson=lesson, is_correct=True).order_by('pk')
+        # every correct answer, and the first correct answer of each question
+        self.submit(self.students[0], [answer.pk for answer in correct])
+        self.submit(self.students[1], [answer.pk for answer in correct if answer.text == 'Answer 0'])
+        self.assertEqual(self.scores(), {self.students[0].pk: 10, self.students[1].pk: 3})
+
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        url = '/api/v1/lessons/%s/regrade/' % lesson.pk
+        self.assertEqual(client.post(url).json()['data'], {'graded': 2, 'changed': 0})
+
+        # a single correct answer left, the first one passes the question
+        answer = Answer.objects.get(question__lesson=lesson, question__type=QUESTION_TYPE.MORE_THAN_ONE_ALL, text='Answer 1')
+        answer.is_correct = False
+        answer.save()
+
+        self.assertEqual(client.post(url).json()['data'], {'graded': 2, 'changed': 1})
+        self.assertEqual(self.scores(), {self.students[0].pk: 10, self.students[1].pk: 7})
+
+        progress = []
+        lesson.refresh_from_db()
+        self.assertEqual(regrade_lesson(lesson, chunk_size=1, progress=lambda *counts: progress.append(counts)), (2, 0))
+        self.assertEqual(progress, [(1, 0), (2, 0)])
+
+    def test_processes_in_atomic_block(self):
+        # test cases run inside a transaction
+        with self.assertRaises(TransactionManagementError):
+            regrade_lesson(self.lessons[1], processes=2)
+
+
+class KeysetPaginationTestCase(ElearningTestCase):
+
+    def walk(self, client, url):
+        ids = []
+        while url:
+            data = client.get(url).json()
+            self.assertNotIn('count', data)
+            ids += [answer['id'] for answer in data['results']]
+            url = data['next']
+        return ids
+
+    def test_pages(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        expected = list(Answer.objects.order_by('pk').values_list('pk', flat=True))
+
+        self.assertEqual(self.walk(client, '/api/v1/answers/?pagination=cursor&page_size=5'), expected)
+        with override_settings(ELEARNING={'COMPILED_SERIALIZERS': False}):
+            self.assertEqual(self.walk(client, '/api/v1/answers/?pagination=cursor&page_size=5'), expected)
+
+        data = client.get('/api/v1/answers/?pagination=cursor&page_size=5&count=true').json()
+        self.assertEqual(data['count'], len(expected))
+
+        response = client.get('/api/v1/answers/?pagination=cursor&count=maybe')
+        self.assertEqual(response.status_code, 400)
+
+
+class StreamingListTestCase(ElearningTestCase):
+
+    url = '/api/v1/answers/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def stream(self, stream):
+        response = self.client.get(self.url, {'stream': stream})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def expected(self):
+        # the pages of the list
+        results, url = [], self.url
+        while url:
+            data = self.client.get(url).json()
+            results += data['results']
+            url = data['next']
+        return sorted(results, key=lambda answer: answer['id'])
+
+    def test_json(self):
+        # several chunks, the last one incomplete
+        with mock.patch.object(AnswerViewSet, 'stream_chunk_size', 5):
+            for compiled in (True, False):
+                with self.subTest(compiled=compiled), override_settings(ELEARNING={'COMPILED_SERIALIZERS': compiled}):
+                    self.assertEqual(json.loads(self.stream('json')), self.expected())
+
+    def test_ndjson(self):
+        with mock.patch.object(AnswerViewSet, 'stream_chunk_size', 6):
+            content = self.stream('ndjson')
+        self.assertTrue(content.endswith(b'\n'))
+        # an object by line
+        self.assertEqual([json.loads(line) for line in content.split(b'\n')[:-1]], self.expected())
+
+    def test_empty(self):
+        Answer.objects.all().delete()
+        self.assertEqual(self.stream('json'), b'[]')
+        self.assertEqual(self.stream('ndjson'), b'')
+
+    def test_invalid(self):
+        self.assertEqual(self.client.get(self.url, {'stream': 'xml'}).status_code, 400)
+
+
+class AccessTokenTestCase(ElearningTestCase):
+
+    def setUp(self):
+        revoked_tokens.clear()
+
+    def test_login_refresh_logout(self):
+        client = APIClient()
+        data = client.post('/api/v1/users/login/', {'username': 'teacher', 'password': 'password'}, format='json').json()
+        access_token = data['data']['accesstoken']
+
+        client.credentials(HTTP_AUTHORIZATION='Bearer %s' % access_token)
+        self.assertEqual(client.get('/api/v1/courses/').status_code, 200)
+
+        self.assertEqual(client.post('/api/v1/users/logout/').status_code, 200)
+        self.assertEqual(client.get('/api/v1/courses/').status_code, 401)
+
+    def test_revocation_is_shared(self):
+        token = AccessToken.for_user(self.teacher)
+        token.revoke()
+
+        # another process only shares the django cache
+        self.assertTrue(RevokedTokens().is_revoked(token.claims['jti']))
+        with self.assertRaises(AuthenticationFailed):
+            AccessToken.verify(token.key)
+
+        with override_settings(ELEARNING={'ACCESS_TOKEN_REVOCATION_CACHE': None}):
+            token = AccessToken.for_user(self.teacher)
+            token.revoke()
+            self.assertFalse(RevokedTokens().is_revoked(token.claims['jti']))
+
+    def test_expired(self):
+        with override_settings(ELEARNING={'ACCESS_TOKEN_LIFETIME': -1}):
+            token = AccessToken.for_user(self.teacher)
+        with self.assertRaises(AuthenticationFailed):
+            AccessToken.verify(token.key)
+
+
+class TokenCacheTestCase(ElearningTestCase):
+
+    def setUp(self):
+        tokens.clear()
+
+    def auth_queries(self, client):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(client.get('/api/v1/users/info/').status_code, 200)
+        return [query['sql'] for query in queries if 'authtoken_token' in query['sql']]
+
+    def test_cached_authentication(self):
+        token = Token.objects.create(user=self.teacher)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token %s' % token.key)
+
+        self.assertTrue(self.auth_queries(client))
+        self.assertFalse(self.auth_queries(client))
+
+        # changing the user evicts its tokens
+        self.teacher.first_name = 'Changed'
+        self.teacher.save()
+        self.assertTrue(self.auth_queries(client))
+
+        token.delete()
+        self.assertEqual(client.get('/api/v1/users/info/').status_code, 401)
+
+    def test_index_follows_entries(self):
+        cache = TokenCache(2, None)
+        for user in self.students:
+            token = Token(key=user.username, user=user)
+            cache.set(token.key, user, token)
+
+        # the least recently used token was evicted, and its index entry
+        self.assertEqual(set(cache._keys), {user.pk for user in self.students[1:]})
+
+        cache = TokenCache(10, 60)
+        cache.set('key', self.teacher, Token(key='key', user=self.teacher))
+        with mock.patch('elearning.cache.time.monotonic', return_value=float('inf')):
+            self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache._keys, {})
+
+        cache.set('key', self.teacher, Token(key='key', user=self.teacher))
+        cache.delete('key')
+        self.assertEqual(cache._keys, {})
@@ -1,16 +1,21 @@
+import enum
 import hashlib
 import os
-import json
 
-from django.utils.encoding import force_text
+from django.utils.encoding import force_text, is_protected_type
 from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.db.models.query import QuerySet
-from django.core.serializers import serialize
 
-from datetime import datetime
+from datetime import date, datetime, time
+from decimal import Decimal
 from jinja2 import Environment, FileSystemLoader
 
+try:
+  import attr
+except ImportError:
+  attr = None
+
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 
 def generate_token(seed=''):
@@ -30,7 +35,7 @@ class LazyEncoder(DjangoJSONEncoder):
             return force_text(obj)
         elif isinstance(obj, enum.Enum):
             return obj.value
-        elif attr.has(obj.__class__):
+        elif attr is not None and attr.has(obj.__class__):
             return attr.asdict(obj)
         elif isinstance(obj, Exception):
             return {
@@ -39,5 +44,37 @@ class LazyEncoder(DjangoJSONEncoder):
             }
         return super(LazyEncoder, self).default(obj)
 
+# Values as the django JSON serializer writes them with `LazyEncoder` and
+# reads them back: types out of json become strings.
+json_encoder = LazyEncoder()
+
+def json_value(obj, field):
+  value = field.value_from_object(obj)
+  if not is_protected_type(value):
+    return field.value_to_string(obj)
+  if isinstance(value, (date, time, Decimal)):
+    return json_encoder.default(value)
+  return value
+
 def to_json(obj):
-  return json.loads(serialize('json', [obj,], cls=LazyEncoder))[0]
\ No newline at end of file
+  """
+  `obj` as `serialize('json', [obj], cls=LazyEncoder)` loaded back, its
+  model, pk and fields, built from the fields without the round trip.
+  """
+  meta = obj._meta.concrete_model._meta
+  pk = obj._meta.pk
+  pk_parent = pk if pk.remote_field and pk.remote_field.parent_link else None
+
+  fields = {}
+  for field in meta.local_fields:
+    if field.serialize or field is pk_parent:
+      fields[field.name] = json_value(obj, field)
+
+  for field in meta.many_to_many:
+    if field.serialize and field.remote_field.through._meta.auto_created:
+      fields[field.name] = [
+        json_value(related, related._meta.pk)
+        for related in getattr(obj, field.name).iterator()
+      ]
+
+  return {'model': str(obj._meta), 'pk': json_value(obj, pk), 'fields': fields}
@@ -1,15 +1,25 @@
+import gzip
+import re
+
 from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from django.contrib.auth import login
+from django.contrib.auth import login, logout
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from django.utils.translation import ugettext as _
 
-from rest_framework import filters, mixins, serializers, status, viewsets
+from rest_framework import exceptions, mixins, serializers, status, viewsets
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.authtoken.models import Token
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 
-from elearning.bases.views import ViewBase, ResponseClient
+from elearning.analytics import get_lesson_stats
+from elearning.authentication import AccessToken
+from elearning.bases.search import IndexedSearchFilter
+from elearning.bases.views import ViewBase, ResponseClient, StandardResultsSetPagination, \
+    PrefetchMixin, CompiledReadMixin, ConditionalGetMixin, StreamingListMixin, SparseFieldsMixin
 from elearning.decorators import serializer_class
 from elearning.serializers import \
     UserSerializer, LoginSerializer, \
@@ -17,19 +27,33 @@ from elearning.serializers import \
     CourseSerializer, BasicCourseSerializer, \
     LessonSerializer, BasicLessonSerializer, \
     QuestionSerializer, BasicQuestionSerializer, \
-    AnswerSerializer, LessonAnswersSerializer
-from elearning.constants import RESPONSE_TYPE, USER_TYPE, QUESTION_TYPE
-from elearning.models import User, Course, Lesson, Question, Answer, AnswerStudent, LessonStudent
+    AnswerSerializer, LessonAnswersSerializer, \
+    BatchSubmissionSerializer, BatchSubmissionsSerializer, \
+    TaskSerializer, SearchHitSerializer, CourseProgressSerializer
+from elearning.conf import get_setting
+from elearning.constants import RESPONSE_TYPE, USER_TYPE
+from elearning.gradebook import EXPORT_FORMATS
+from elearning.grading import get_answer_key
+from elearning.leaderboards import get_leaderboard
+from elearning.prerequisites import unlocked
+from elearning.regrading import regrade_lesson, regrade_course
+from elearning.search import search_catalog
+from elearning.submissions import save_submission, save_submissions
+from elearning.syllabus import get_audience, get_syllabus
+from elearning.tasks import grade_submission, regrade_lesson_submissions, regrade_course_submissions
+from elearning.models import User, Course, Lesson, Question, Answer, CourseProgress, Task
 from elearning.permissions import IsTeacherUser, IsStudentUser
 
-class UserViewSet(viewsets.ModelViewSet):
+ACCEPTS_GZIP_RE = re.compile(r'\bgzip\b')
+
+class UserViewSet(StreamingListMixin, PrefetchMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
     filter_backends = (
         DjangoFilterBackend,
-        filters.SearchFilter,
+        IndexedSearchFilter,
     )
 
     filterset_fields = [
@@ -61,23 +85,66 @@ class UserViewSet(viewsets.ModelViewSet):
         login(request, user)
 
         user_data = UserSerializer(instance=user).data
-        
+        access_token = AccessToken.for_user(user)
+
         return ResponseClient(
             type=RESPONSE_TYPE.SUCCESS,
             message=_("You have successfully logged in."),
             data={
                 "user": user_data,
-                "authtoken": token.key
+                "authtoken": token.key,
+                "accesstoken": access_token.key,
+                "expires_in": access_token.expires_in
             }
         )
 
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def token(self, request):
+        '''
+        Get a new access token, authenticated by the authtoken.
+        '''
+        if isinstance(request.auth, AccessToken):
+            raise exceptions.PermissionDenied(_("Use the authtoken to get a new access token."))
+
+        access_token = AccessToken.for_user(request.user)
+
+        return Response({
+            "accesstoken": access_token.key,
+            "expires_in": access_token.expires_in
+        })
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def logout(self, request):
+        '''
+        Logout user, revoking the access token used.
+        '''
+        if isinstance(request.auth, AccessToken):
+            request.auth.revoke()
+
+        logout(request)
+
+        return ResponseClient(
+            type=RESPONSE_TYPE.SUCCESS,
+            message=_("You have successfully logged out.")
+        )
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def info(self, request):
         if not request.user:
             raise APIException(_("You are not logged in."))
 
-        user_data = UserSerializer(instance=request.user).data
-        token, created = Token.objects.get_or_create(user=request.user)
+        user = request.user
+        if isinstance(request.auth, AccessToken):
+            # access tokens only carry the claims of their user
+            user = User.objects.get(pk=user.pk)
+
+        user_data = UserSerializer(instance=user).data
+
+        # authenticated by token, no need to look it up again
+        token = request.auth
+        if not isinstance(token, Token):
+            token, created = Token.objects.get_or_create(user=user)
+
         
         return Response({
             "user": user_data,
@@ -102,14 +169,14 @@ class StudentViewSet(UserViewSet):
             user_type=USER_TYPE.STUDENT
         )
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(ConditionalGetMixin, CompiledReadMixin, PrefetchMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Course.objects.all()
 
     def get_queryset(self):
-        courses = Lesson.objects.all()
+        courses = Course.objects.all()
 
         if self.request.user.user_type == USER_TYPE.STUDENT:
-            courses.objects.all().filter(opened=True)
+            courses = courses.filter(opened=True)
         
         return courses
 
@@ -119,14 +186,103 @@ class CourseViewSet(viewsets.ModelViewSet):
         return BasicCourseSerializer
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'gradebook']:
             permission_classes = [IsAuthenticated&(IsAdminUser|IsTeacherUser)]
         else:
             permission_classes = [IsAuthenticated]
             
         return [permission() for permission in permission_classes]
 
-class LessonViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'])
+    def leaderboard(self, request, pk):
+        '''
+        Best students of the course, or of one of its lessons with `?lesson=`,
+        `?limit=` of them, and the `?around=` students next to the user.
+        '''
+        course = self.get_object()
+
+        if request.query_params.get('lesson'):
+            lesson = get_object_or_404(Lesson.objects.filter(course=course), pk=self._int_param('lesson', 0))
+            leaderboard = get_leaderboard('lesson', lesson.pk)
+        else:
+            leaderboard = get_leaderboard('course', course.pk)
+
+        limit = min(self._int_param('limit', 10), 100)
+        around = min(self._int_param('around', 0), 50)
+
+        top = leaderboard.top(limit)
+        neighbours = leaderboard.around(request.user.pk, around) if around else []
+
+        usernames = dict(User.objects.filter(
+            pk__in={student for rank, student, score in top + neighbours}
+        ).values_list('pk', 'username'))
+
+        def entries(rows):
+            return [
+                {"rank": rank, "student": student, "username": usernames.get(student), "score": score}
+                for rank, student, score in rows
+            ]
+
+        rank = leaderboard.rank(request.user.pk)
+
+        return Response({
+            "count": len(leaderboard),
+            "top": entries(top),
+            "me": {"rank": rank, "score": leaderboard.scores[request.user.pk]} if rank else None,
+            "around": entries(neighbours)
+        })
+
+    @action(detail=True, methods=['get'])
+    def gradebook(self, request, pk):
+        '''
+        Scores of every student in every lesson, streamed as `?export=csv` or `?export=jsonl`.
+        '''
+        course = self.get_object()
+
+        export_format = request.query_params.get('export', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            raise exceptions.ParseError(_("export must be one of %s.") % ', '.join(sorted(EXPORT_FORMATS)))
+
+        export, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(export(course), content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="course-%s-gradebook.%s"' % (course.pk, export_format)
+        return response
+
+    @action(detail=True, methods=['get'])
+    def syllabus(self, request, pk):
+        '''
+        The whole course, its lessons with their questions and answers, in a
+        single JSON document rendered once by course version, gzipped when
+        the client accepts it.
+        '''
+        course = self.get_object()
+        audience = get_audience(request.user)
+
+        gzipped = bool(ACCEPTS_GZIP_RE.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+        # both encodings are different representations, with their own tag
+        etag = '"syllabus-%s-%s-%s%s"' % (course.pk, course.version, audience, '-gzip' if gzipped else '')
+        response = get_conditional_response(request, etag=etag)
+
+        if response is None:
+            content = get_syllabus(course, audience)
+            if gzipped:
+                response = HttpResponse(content, content_type='application/json')
+                response['Content-Encoding'] = 'gzip'
+            else:
+                response = HttpResponse(gzip.decompress(content), content_type='application/json')
+
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding', 'Authorization', 'Cookie'))
+        return response
+
+    def _int_param(self, name, default):
+        try:
+            return max(0, int(self.request.query_params.get(name, default)))
+        except ValueError:
+            raise exceptions.ParseError(_("%s must be an integer.") % name)
+
+class LessonViewSet(StreamingListMixin, ConditionalGetMixin, CompiledReadMixin, PrefetchMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Lesson.objects.all()
 
     def get_queryset(self):
@@ -137,7 +293,7 @@ class LessonViewSet(viewsets.ModelViewSet):
             lessons = Lesson.objects.all()
 
         if self.request.user.user_type == USER_TYPE.STUDENT:
-            lessons.filter(opened=True)
+            lessons = lessons.filter(opened=True)
         
         return lessons
 
@@ -151,90 +307,53 @@ class LessonViewSet(viewsets.ModelViewSet):
             return self.serializer_class
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'regrade', 'regrade_course', 'stats']:
             permission_classes = [IsAuthenticated&(IsAdminUser|IsTeacherUser)]
         elif self.action == 'select_answers':
             permission_classes = [IsStudentUser]
+        elif self.action == 'select_answers_batch':
+            permission_classes = [IsAuthenticated&(IsAdminUser|IsTeacherUser)]
         else:
             permission_classes = [IsAuthenticated]
             
         return [permission() for permission in permission_classes]
 
     @action(detail=True, methods=['post'], serializer_class=LessonAnswersSerializer)
-    def select_answers(self, request, pk):
-        score = 0
-        list_answers_student = []
-
-        # get user and data from request
+    def select_answers(self, request, pk, course_pk=None):
+        # get user from request
         user = request.user
-        data = request.data
-        # get answers sended
-        answers_pk = data.get('answers', None)
-
-        # validate data
-        serializer = LessonAnswersSerializer(data=data, many=True)
-        serializer.is_valid(raise_exception=True)
 
-        # get lesson 
-        lesson = Lesson.objects.get(pk=pk)
-        # get answers filtering by answers sended
-        answers = Answer.objects.filter(pk__in=answers_pk)
-        # get questions filtering by answers object
-        questions = Question.objects.filter(answers__in=answers)
+        # get lesson and its answer key
+        lesson = self.get_object()
+        answer_key = get_answer_key(lesson)
 
-        # delete previously saved answers by lesson and user
-        AnswerStudent.objects.filter(answer__question__lesson=lesson, student=user).delete()
+        # validate answers sended against the answer key
+        serializer = LessonAnswersSerializer(data=request.data, context={'answer_key': answer_key})
+        serializer.is_valid(raise_exception=True)
+        answers_pk = serializer.validated_data['answers']
 
-        # preparing to save list answers sended for user
-        for answer in answers:
-            list_answers_student.append(AnswerStudent(answer=answer, student=user)) 
+        # acknowledge now and grade in background
+        if get_setting('DEFERRED_GRADING') or ViewBase.str2bool(request.query_params.get('deferred')):
+            task_id = ViewBase.run_async(grade_submission, True, lesson.pk, user.pk, answers_pk, user=user)
 
-        # save list answers
-        AnswerStudent.objects.bulk_create(list_answers_student)
+            return ResponseClient(
+                type=RESPONSE_TYPE.INFO,
+                message=_("Answers received, your score will be available soon."),
+                data={
+                    "task_id": task_id
+                },
+                status=status.HTTP_202_ACCEPTED
+            )
 
-        # get score for question type boolean answer
-        def question_boolean(question, answers):
-            if answers.filter(question=question, is_correct=True).exists():
-                return question.score
-            else:
-                return 0
-        # get score for question type one answer correct
-        def question_one(question, answers):
-            return question_boolean(question, answers)
-        # get score for question type more than one answers correct
-        def question_more_than_one(question, answers):
-            if len(answers.filter(question=question, is_correct=True)) > 1:
-                return question.score
-            else:
-                return 0
-        # get score for question type more than one and all answers correct
-        def question_more_than_one_all(question, answers):
-            if len(Answers.objects.filter(question=question, is_correct=True)) == \
-                len(answer.filter(question=question, is_correct=True)):
-                return question.score
-            else:
-                return 0
-
-        # group method
-        method_score_question = { 
-            QUESTION_TYPE.BOOLEAN : question_boolean,
-            QUESTION_TYPE.ONE : question_one,
-            QUESTION_TYPE.MORE_THAN_ONE : question_more_than_one,
-            QUESTION_TYPE.MORE_THAN_ONE_ALL : question_more_than_one_all
-        }
-        
-        # get score for each question
-        for question in questions:
-            score += method_score_question[question.type](question, answers)
+        # get score for all questions in a single pass
+        score = answer_key.grade(answers_pk)
 
-        # delete previously saved lesson by lesson and user
-        LessonStudent.objects.filter(lesson=lesson, student=user).delete()
-        # save lesson with score
-        LessonStudent.objects.create(lesson=lesson, student=user, score=score)
+        # save answers sended and score, only the changes are written
+        save_submission(answer_key, user.pk, answers_pk, score)
 
         # is approval score?
         approval_score = lesson.approval_score
-        lesson_approved = lesson.approval_score <= score
+        lesson_approved = approval_score is None or approval_score <= score
 
         return ResponseClient(
             type=RESPONSE_TYPE.SUCCESS,
@@ -246,7 +365,139 @@ class LessonViewSet(viewsets.ModelViewSet):
             }
         )
 
-class QuestionViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], serializer_class=BatchSubmissionsSerializer)
+    def select_answers_batch(self, request, course_pk=None):
+        '''
+        Grade and save the answers of many students at once.
+        '''
+        serializer = BatchSubmissionsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['submissions']
+
+        # load lessons, students and answer keys once for the whole batch
+        lessons = self.get_queryset().in_bulk(self._batch_ids(items, 'lesson'))
+        students = set(User.objects.filter(
+            pk__in=self._batch_ids(items, 'student'),
+            user_type=USER_TYPE.STUDENT
+        ).values_list('pk', flat=True))
+        context = {
+            'lessons': lessons,
+            'students': students,
+            'answer_keys': {pk: get_answer_key(lesson) for pk, lesson in lessons.items()}
+        }
+
+        results = []
+        submissions = []
+        for index, item in enumerate(items):
+            item_serializer = BatchSubmissionSerializer(data=item, context=context)
+
+            if not item_serializer.is_valid():
+                results.append({"index": index, "errors": item_serializer.errors})
+                continue
+
+            data = item_serializer.validated_data
+            score = data['answer_key'].grade(data['answers'])
+            submissions.append((data['answer_key'], data['student'], data['answers'], score))
+            results.append({
+                "index": index,
+                "student": data['student'],
+                "lesson": data['lesson'].pk,
+                "score": score
+            })
+
+        # save every graded submission in one transaction
+        save_submissions(submissions)
+
+        return ResponseClient(
+            type=RESPONSE_TYPE.SUCCESS if len(submissions) == len(items) else RESPONSE_TYPE.WARNING,
+            message=_("%s of %s submissions saved") % (len(submissions), len(items)),
+            data=results
+        )
+
+    @staticmethod
+    def _task_accepted(task_id):
+        return ResponseClient(
+            type=RESPONSE_TYPE.INFO,
+            message=_("Task queued."),
+            data={
+                "task_id": task_id
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
+
+    @staticmethod
+    def _batch_ids(items, name):
+        ids = set()
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                ids.add(int(item.get(name)))
+            except (TypeError, ValueError):
+                pass
+        return ids
+
+    @action(detail=True, methods=['post'])
+    def regrade(self, request, pk, course_pk=None):
+        '''
+        Grade again every submission of the lesson.
+        '''
+        lesson = self.get_object()
+
+        if ViewBase.str2bool(request.query_params.get('deferred')):
+            return self._task_accepted(
+                ViewBase.run_async(regrade_lesson_submissions, True, lesson.pk, user=request.user)
+            )
+
+        graded, changed = regrade_lesson(lesson)
+
+        return ResponseClient(
+            type=RESPONSE_TYPE.SUCCESS,
+            message=_("%s submissions regraded, %s scores changed") % (graded, changed),
+            data={
+                "graded": graded,
+                "changed": changed
+            }
+        )
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk, course_pk=None):
+        '''
+        Score distribution and statistics of each question of the lesson.
+        '''
+        return Response(get_lesson_stats(self.get_object()))
+
+    @action(detail=False, methods=['post'], url_path='regrade', url_name='regrade-course')
+    def regrade_course(self, request, course_pk=None):
+        '''
+        Grade again every submission of the lessons of a course.
+        '''
+        if not course_pk:
+            return ResponseClient(
+                type=RESPONSE_TYPE.ERROR,
+                message=_("Course regrading is only available on courses/{id}/lessons/regrade."),
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        course = get_object_or_404(Course, pk=course_pk)
+
+        if ViewBase.str2bool(request.query_params.get('deferred')):
+            return self._task_accepted(
+                ViewBase.run_async(regrade_course_submissions, True, course.pk, user=request.user)
+            )
+
+        graded, changed = regrade_course(course)
+
+        return ResponseClient(
+            type=RESPONSE_TYPE.SUCCESS,
+            message=_("%s submissions regraded, %s scores changed") % (graded, changed),
+            data={
+                "graded": graded,
+                "changed": changed
+            }
+        )
+
+class QuestionViewSet(StreamingListMixin, ConditionalGetMixin, CompiledReadMixin, PrefetchMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Question.objects.all()
 
     def get_queryset(self):
@@ -256,7 +507,7 @@ class QuestionViewSet(viewsets.ModelViewSet):
         else:
             questions = Question.objects.all()
 
-        return question
+        return questions
 
     def get_serializer_class(self):
         if self.request.user.is_staff:
@@ -271,7 +522,7 @@ class QuestionViewSet(viewsets.ModelViewSet):
             
         return [permission() for permission in permission_classes]
 
-class AnswerViewSet(viewsets.ModelViewSet):
+class AnswerViewSet(StreamingListMixin, ConditionalGetMixin, CompiledReadMixin, PrefetchMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Answer.objects.all()
     serializer_class = AnswerSerializer
 
@@ -289,3 +540,64 @@ class AnswerViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthenticated]
             
         return [permission() for permission in permission_classes]
+
+class TaskViewSet(SparseFieldsMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    queryset = Task.objects.all()
+    serializer_class = TaskSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # users only follow their own tasks
+        if self.request.user.is_staff:
+            return self.queryset
+        return self.queryset.filter(user=self.request.user)
+
+class SearchViewSet(SparseFieldsMixin, viewsets.GenericViewSet):
+    serializer_class = SearchHitSerializer
+    pagination_class = StandardResultsSetPagination
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        '''
+        Search courses and lessons by title and description with `?search=`.
+        '''
+        hits = search_catalog(request.query_params.get('search', ''), request.user)
+
+        page = self.paginate_queryset(hits)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+class MeViewSet(viewsets.GenericViewSet):
+    permission_classes = [IsAuthenticated&IsStudentUser]
+
+    @action(detail=False, methods=['get'])
+    def unlocked(self, request):
+        '''
+        Opened courses and lessons whose prerequisites the student approved.
+        '''
+        rows = unlocked(
+            request.user,
+            courses=Course.objects.filter(opened=True),
+            lessons=Lesson.objects.filter(opened=True)
+        )
+
+        data = {"courses": [], "lessons": []}
+        for type, pk, title, course in rows:
+            if type == 'course':
+                data["courses"].append({"id": pk, "title": title})
+            else:
+                data["lessons"].append({"id": pk, "title": title, "course": course})
+
+        return Response(data)
+
+    @action(detail=False, methods=['get'], serializer_class=CourseProgressSerializer)
+    def progress(self, request):
+        '''
+        Progress of the student in each course, as saved with the submissions.
+        '''
+        progress = CourseProgress.objects.filter(student=request.user) \
+            .select_related('course') \
+            .order_by('course')
+
+        serializer = self.get_serializer(progress, many=True)
+        return Response(serializer.data)